@@ -0,0 +1,251 @@
+import math
+
+import numpy as np
+
+import flight_sim
+import physics
+from environment import ExponentialAtmosphere, InverseSquareGravity
+from flight_sim import effective_nose_radius
+from orbit import Orbit, orbit_elements
+from trajectory import Trajectory, FIELDS, STATE_FIELDS, DESCRIPTION_CODES
+from vehicle import Vehicle
+
+# flight phase of every lane
+ASCENT = 0
+COAST = 1
+CIRCULARIZING = 2
+DONE = 3
+
+# description code recorded for each phase
+PHASE_DESCRIPTIONS = np.array([DESCRIPTION_CODES['Ascent'], DESCRIPTION_CODES['Waiting for apoapsis'],
+                               DESCRIPTION_CODES['Circularizing'], 0], dtype=np.int8)
+
+
+class BatchResult:
+    """Final values of every lane of a batch simulation."""
+
+    def __init__(self, lanes, trajectories=None):
+        for name in FIELDS + ('fuel_left', 'loss_gravity', 'loss_drag', 'deltaV'):
+            setattr(self, name, lanes[name])
+        self.trajectories = trajectories
+
+    def __len__(self):
+        return len(self.t)
+
+    def orbit(self, i):
+        """Final orbit of lane i."""
+        return Orbit(self.h[i], self.v[i], self.gamma[i])
+
+
+class BatchFlightSim:
+    """Simulates many launch configurations at once.
+
+    Every configuration is one lane of numpy arrays which are advanced together. The lanes follow
+    the same flight logic as FlightSim (staging, shutdown at the target apoapsis, coasting and
+    circularization), each on its own schedule. stages holds the stages of every lane, either as a
+    list of stages or as a compiled Vehicle. Like the target orbits and time steps the effective
+    area is one value for all lanes or one per lane.
+    """
+
+    def __init__(self, stages, gravity_turns, target_orbits=0, circularize=False, time_step=0.02,
+                 atmosphere=None, gravity=None, effective_area=flight_sim.effective_area):
+        n = len(stages)
+        if len(gravity_turns) != n:
+            raise ValueError('one gravity turn per configuration is required')
+
+        self.n = n
+        self.time_step = np.broadcast_to(np.asarray(time_step, dtype=float), (n,)).copy()
+        self.target_orbit = np.broadcast_to(np.asarray(target_orbits, dtype=float), (n,)).copy()
+        self.circ = np.broadcast_to(np.asarray(circularize, dtype=bool), (n,)).copy()
+        self.effective_area = np.broadcast_to(np.asarray(effective_area, dtype=float), (n,)).copy()
+        self.turn_start = np.array([g.start for g in gravity_turns], dtype=float)
+        self.turn_end = np.array([g.end for g in gravity_turns], dtype=float)
+        self.turn_angle = np.array([math.radians(g.angle) for g in gravity_turns])
+        self.atmosphere = atmosphere or ExponentialAtmosphere()
+        self.gravity = gravity or InverseSquareGravity()
+
+        # per lane and stage tables, padded for lanes with fewer stages
+        self.stage_count = np.array([len(s) for s in stages])
+        shape = (n, self.stage_count.max())
+        self.thrust = np.zeros(shape)
+        self.mass_flux = np.zeros(shape)
+        self.start_mass = np.zeros(shape)
+        self.eff_payload_mass = np.zeros(shape)
+        self.burn_time = np.zeros(shape)
+        self.final_dry_mass = np.zeros(n)
+        for lane, lane_stages in enumerate(stages):
+            vehicle = lane_stages if isinstance(lane_stages, Vehicle) else Vehicle(lane_stages)
+            count = len(vehicle)
+            self.thrust[lane, :count] = vehicle.thrust
+            self.mass_flux[lane, :count] = vehicle.mass_flux
+            self.start_mass[lane, :count] = vehicle.start_mass
+            self.eff_payload_mass[lane, :count] = vehicle.upper_mass
+            self.burn_time[lane, :count] = vehicle.burn_time
+            self.final_dry_mass[lane] = vehicle.final_dry_mass
+
+    def simulate(self, record=False):
+        """Runs all lanes to the end of their flight and returns a BatchResult.
+
+        Only the lanes still in flight are advanced: the arrays hold one row per flying lane and the
+        rows of a lane are dropped once it is done. With record=True the result also holds one
+        Trajectory per lane.
+        """
+        n = self.n
+        # lane of every row
+        lanes = np.arange(n)
+        dt, target_orbit, circ, effective_area, turn_start, turn_end, turn_angle, last_stage_index = \
+            self._lane_values(lanes)
+        atmosphere, gravity = self.atmosphere.for_lanes(lanes), self.gravity.for_lanes(lanes)
+
+        t = np.zeros(n)
+        v = np.zeros(n)
+        m = np.zeros(n)
+        h = np.zeros(n)
+        gamma = np.full(n, math.pi * 0.5)
+        a = np.zeros(n)
+        temp = np.zeros(n)
+        local_horizon = np.zeros(n)
+        elements = orbit_elements(h, v, gamma)
+        loss_gravity = np.zeros(n)
+        loss_drag = np.zeros(n)
+        deltaV = np.zeros(n)
+
+        phase = np.full(n, ASCENT)
+        stage_index = np.zeros(n, dtype=int)
+        stage_time = np.zeros(n)
+        thrust, mass_flux, start_mass, upper_mass, burn_time = self._stage_values(lanes, stage_index)
+        prev_h = h.copy()
+        prev_ecc = elements['eccentricity'].copy()
+        density = atmosphere.densities(h)
+        g = gravity.accelerations(h)
+        # final values of the lanes, written when they are done
+        final = {name: values.copy() for name, values in self._final_values(
+            t, v, m, h, gamma, a, temp, local_horizon, elements, loss_gravity, loss_drag, deltaV).items()}
+        records = []
+
+        while True:
+            # resolve staging and phase changes before the next step
+            while True:
+                burnt_out = (phase == ASCENT) & (stage_time >= burn_time)
+                if not burnt_out.any():
+                    break
+                last_stage = stage_index == last_stage_index
+                phase[burnt_out & last_stage] = DONE
+                staging = burnt_out & ~last_stage
+                stage_index[staging] += 1
+                stage_time[staging] = 0
+                thrust, mass_flux, start_mass, upper_mass, burn_time = self._stage_values(lanes, stage_index)
+            phase[(phase == COAST) & ~(h > prev_h)] = CIRCULARIZING
+            phase[(phase == CIRCULARIZING) & ~(stage_time < burn_time)] = DONE
+
+            done = phase == DONE
+            if done.any():
+                for name, values in self._final_values(t, v, m, h, gamma, a, temp, local_horizon, elements,
+                                                       loss_gravity, loss_drag, deltaV).items():
+                    final[name][lanes[done]] = values[done]
+                flying = ~done
+                (lanes, t, v, m, h, gamma, a, temp, local_horizon, loss_gravity, loss_drag, deltaV, phase, stage_index,
+                 stage_time, prev_h, prev_ecc, density, g) = (values[flying] for values in (
+                    lanes, t, v, m, h, gamma, a, temp, local_horizon, loss_gravity, loss_drag, deltaV, phase,
+                    stage_index, stage_time, prev_h, prev_ecc, density, g))
+                elements = {name: values[flying] for name, values in elements.items()}
+                if not len(lanes):
+                    break
+                dt, target_orbit, circ, effective_area, turn_start, turn_end, turn_angle, last_stage_index = \
+                    self._lane_values(lanes)
+                atmosphere, gravity = self.atmosphere.for_lanes(lanes), self.gravity.for_lanes(lanes)
+                thrust, mass_flux, start_mass, upper_mass, burn_time = self._stage_values(lanes, stage_index)
+
+            engines_on = phase != COAST
+            stage_mass = start_mass - mass_flux * stage_time
+            m = np.where(engines_on, upper_mass + stage_mass, m)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # acceleration in the direction of flight
+                T = np.where(engines_on, thrust, 0) * np.cos(a)
+                D = density * (v ** 2) * effective_area * 0.5
+                Fg = m * g * np.sin(gamma)
+                loss_drag = loss_drag + D / m * dt
+                loss_gravity = loss_gravity + Fg / m * dt
+                deltaV = deltaV + T / m * dt
+                prev_h, prev_ecc = h, elements['eccentricity']
+                v = v + (T - D - Fg) / m * dt
+
+                h = h + v * np.cos(math.pi / 2 - gamma) * dt
+                # the models are evaluated once per step, the values are reused by the next step
+                density = atmosphere.densities(h)
+                g = gravity.accelerations(h)
+
+                # angular velocity, uses the stage thrust even while coasting like FlightSim
+                T = thrust * np.sin(a)
+                c = (-g + (v ** 2) / (physics.earth_radius + h))
+                gamma = gamma + (np.cos(gamma) * c + T / m) / v * dt
+
+                temp = _max_temperature(v, density, effective_nose_radius)
+                elements = orbit_elements(h, v, gamma)
+            t = t + dt
+
+            # apply gravity turn adjustments
+            turning = (turn_start < h) & (h < turn_end)
+            a = np.where(turning, turn_angle, 0)
+
+            # update local horizon angle
+            local_horizon = local_horizon + np.arctan(v * dt * np.cos(gamma) / (physics.earth_radius + h))
+
+            if record:
+                records.append((lanes, PHASE_DESCRIPTIONS[phase], t, v, m, h, gamma, a, temp, local_horizon))
+
+            stage_time = np.where(engines_on, stage_time + dt, stage_time)
+
+            # handle engine shutdown on the last stage
+            eccentricity_rising = prev_ecc < elements['eccentricity']
+            last_stage = stage_index == last_stage_index
+            at_target = (phase == ASCENT) & last_stage & (elements['apoapsis_height'] >= target_orbit)
+            phase[at_target & circ & (target_orbit > 0)] = COAST
+            phase[at_target & circ & (target_orbit <= 0)] = DONE
+            phase[at_target & ~circ & eccentricity_rising] = DONE
+            phase[(phase == CIRCULARIZING) & eccentricity_rising] = DONE
+
+        final['fuel_left'] = final['m'] - self.final_dry_mass
+        trajectories = self._trajectories(records) if record else None
+        return BatchResult(final, trajectories)
+
+    def _lane_values(self, lanes):
+        """Returns the time step, target orbit, circularization, effective area, gravity turn and last stage index
+        of the given lanes."""
+        return (self.time_step[lanes], self.target_orbit[lanes], self.circ[lanes], self.effective_area[lanes],
+                self.turn_start[lanes], self.turn_end[lanes], self.turn_angle[lanes], self.stage_count[lanes] - 1)
+
+    def _stage_values(self, lanes, stage_index):
+        """Returns the thrust, mass flux, start mass, upper mass and burn time of the current stage of the lanes."""
+        return (self.thrust[lanes, stage_index], self.mass_flux[lanes, stage_index],
+                self.start_mass[lanes, stage_index], self.eff_payload_mass[lanes, stage_index],
+                self.burn_time[lanes, stage_index])
+
+    @staticmethod
+    def _final_values(t, v, m, h, gamma, a, temp, local_horizon, elements, loss_gravity, loss_drag, deltaV):
+        return {'t': t, 'v': v, 'm': m, 'h': h, 'gamma': gamma, 'a': a, 'temp': temp, 'local_horizon': local_horizon,
+                **elements, 'loss_gravity': loss_gravity, 'loss_drag': loss_drag, 'deltaV': deltaV}
+
+    def _trajectories(self, records):
+        """Collects the recorded rows of every lane into its Trajectory."""
+        if not records:
+            return [Trajectory() for _ in range(self.n)]
+
+        lanes, description, *columns = (np.concatenate(column) for column in zip(*records))
+        records.clear()
+        # the rows of a lane in the order of their steps
+        order = np.argsort(lanes, kind='stable')
+        bounds = np.searchsorted(lanes, np.arange(self.n + 1), sorter=order)
+        trajectories = []
+        for lane in range(self.n):
+            rows = order[bounds[lane]:bounds[lane + 1]]
+            lane_columns = {name: column[rows] for name, column in zip(STATE_FIELDS, columns)}
+            trajectories.append(Trajectory.from_columns(lane_columns, description[rows]))
+        return trajectories
+
+
+def _max_temperature(velocity, density, effective_radius, emmisivity=.8):
+    return (physics.k / (emmisivity * physics.sigma) * (velocity ** 3) * np.sqrt(
+        density / effective_radius) + 293 ** 4) ** (1 / 4)
+
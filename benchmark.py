@@ -0,0 +1,234 @@
+"""Benchmarks of the simulator hot paths with a regression check against saved baselines.
+
+    python benchmark.py --save baseline.json      run all scenarios and save the results
+    python benchmark.py --compare baseline.json   fail if a scenario got slower or its orbit changed
+"""
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import timeit
+import tracemalloc
+
+import flight_sim
+from environment import ExponentialAtmosphere, StandardAtmosphere, TabulatedAtmosphere
+from flight_sim import FlightSim, State
+from input_reader import read_staging_output
+from optimizer import split_stages
+from orbit import Orbit
+from physics import Physics
+
+input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input.txt')
+
+# functions whose time is reported per scenario
+PROFILED_FUNCTIONS = ('advance_state', 'acceleration_in_dir_of_flight', 'angular_velocity', 'max_temperature',
+                      'environment', 'update', 'append')
+
+# largest relative miss of the target orbit by the final apoapsis and periapsis of a scenario
+ORBIT_TOLERANCE = 0.05
+
+
+def task1():
+    """The main.py task 1 setup."""
+    stages = list(read_staging_output(input_file))
+    return FlightSim(stages, flight_sim.GravityTurn(1000, 3500, 3), 400000, True, time_step=0.01)
+
+
+def task2():
+    """Circularization at 270 km with 90 % of the stage mass in the first stage."""
+    stages = split_stages(list(read_staging_output(input_file)), [0.9])
+    return FlightSim(stages, flight_sim.GravityTurn(1000, 3500, 3.2), 270000, True, time_step=0.01)
+
+
+def long_coast():
+    """Circularization at 1500 km after a coast of more than half an hour."""
+    stages = list(read_staging_output(input_file))
+    return FlightSim(stages, flight_sim.GravityTurn(1000, 3500, 3), 1500000, True, time_step=0.01)
+
+
+SCENARIOS = {'task1': task1, 'task2': task2, 'long_coast': long_coast}
+
+
+def run_scenario(name, profile=True):
+    """Runs a scenario and returns its speed, peak memory, per function times and final orbit.
+
+    Raises ValueError if the scenario does not circularize within ORBIT_TOLERANCE of its target orbit.
+    """
+    # the stage setup prints as well
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = SCENARIOS[name]()
+
+        start = time.perf_counter()
+        result = sim.simulate()
+        wall_time = time.perf_counter() - start
+        check_orbit(name, sim, result)
+
+        tracemalloc.start()
+        SCENARIOS[name]().simulate()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        function_times = {}
+        if profile:
+            profiler = cProfile.Profile()
+            profiler.runcall(SCENARIOS[name]().simulate)
+            for (_, _, function), (_, _, _, cumulative, _) in pstats.Stats(profiler).stats.items():
+                if function in PROFILED_FUNCTIONS:
+                    function_times[function] = function_times.get(function, 0) + cumulative
+
+    return {
+        'steps': len(result),
+        'wall_time': wall_time,
+        'steps_per_second': len(result) / wall_time,
+        'peak_memory': peak_memory,
+        'function_times': function_times,
+        'apoapsis_height': float(result.apoapsis_height[-1]),
+        'periapsis_height': float(result.periapsis_height[-1]),
+        'fuel_left': float(result.m[-1] - sim.vehicle.final_dry_mass),
+    }
+
+
+def check_orbit(name, sim, result):
+    """Raises ValueError unless the flight ends circularizing at its target orbit."""
+    misses = [abs(result.apoapsis_height[-1] - sim.target_orbit), abs(result.periapsis_height[-1] - sim.target_orbit)]
+    if result.description[-1] != 'Circularizing' or not max(misses) <= ORBIT_TOLERANCE * sim.target_orbit:
+        raise ValueError(f'{name} does not reach its {sim.target_orbit / 1000:.0f} km orbit: apoapsis '
+                         f'{result.apoapsis_height[-1] / 1000:.1f} km, periapsis '
+                         f'{result.periapsis_height[-1] / 1000:.1f} km after {result.t[-1]:.2f}s')
+
+
+def run_micro_benchmarks(number=100000):
+    """Times single calls of the functions called in every step, in microseconds per call."""
+    state = State()
+    state.v, state.h, state.m, state.gamma, state.a = 2000, 50000, 10000, 1.2, 0.05
+    orbit = Orbit(state.h, state.v, state.gamma)
+    sim = FlightSim([], None, time_step=0.01)
+    exponential, standard = ExponentialAtmosphere(), StandardAtmosphere()
+    tabulated = TabulatedAtmosphere(standard)
+    benchmarks = {
+        'Orbit.update': lambda: orbit.update(state.h, state.v, state.gamma),
+        'Orbit.apoapsis_height': lambda: Orbit(state.h, state.v, state.gamma).apoapsis_height,
+        'Physics.atmospheric_density': lambda: Physics.atmospheric_density(state.h),
+        'Physics.gravitational_acceleration': lambda: Physics.gravitational_acceleration(state.h),
+        'Physics.acceleration_in_dir_of_flight': lambda: Physics.acceleration_in_dir_of_flight(
+            40000, state, flight_sim.effective_area, sim),
+        'Physics.angular_velocity': lambda: Physics.angular_velocity(40000, state),
+        'Physics.max_temperature': lambda: Physics.max_temperature(state.v, state.h, flight_sim.effective_nose_radius),
+        # the table pays off for the standard atmosphere, not for the exponential one
+        'ExponentialAtmosphere.density': lambda: exponential.density(state.h),
+        'StandardAtmosphere.density': lambda: standard.density(state.h),
+        'TabulatedAtmosphere(StandardAtmosphere).density': lambda: tabulated.density(state.h),
+    }
+    return {name: timeit.timeit(function, number=number) / number * 1e6 for name, function in benchmarks.items()}
+
+
+def run_plotter_benchmark():
+    """Times the Plotter setup and the drawing of one frame, None without matplotlib."""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from matplotlib.gridspec import GridSpec
+        from plotter import Plotter
+    except ImportError:
+        return None
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = task1().simulate()
+
+    start = time.perf_counter()
+    plotter = Plotter(result)
+    init_time = time.perf_counter() - start
+
+    fig = plt.figure(figsize=(10, 8))
+    gs = GridSpec(4, 2, width_ratios=[1, 1])
+    ax1 = fig.add_subplot(gs[0, 1])
+    axes = [fig.add_subplot(gs[i, 1], sharex=ax1) for i in range(1, 4)]
+    ax_left = fig.add_subplot(gs[:, 0])
+    text = plt.text(0.5, .6, "s", fontsize=12)
+    elements = plotter._initialize_frame(fig, ax_left, ax1, *axes, text)
+
+    start = time.perf_counter()
+    plotter._update_frame(len(plotter.time) // 2, *elements)
+    fig.canvas.draw()
+    frame_time = time.perf_counter() - start
+    plt.close(fig)
+    return {'init_time': init_time, 'frame_time': frame_time}
+
+
+def run_all(profile=True):
+    return {
+        'scenarios': {name: run_scenario(name, profile) for name in SCENARIOS},
+        'micro': run_micro_benchmarks(),
+        'plotter': run_plotter_benchmark(),
+    }
+
+
+def compare(results, baseline, threshold=0.2, tolerance=1.0):
+    """Returns the regressions of the results against the baseline as a list of messages.
+
+    A scenario regresses when its steps per second drop by more than the threshold fraction, or when
+    its final apoapsis or periapsis height moved by more than tolerance meters.
+    """
+    failures = []
+    for name, base in baseline['scenarios'].items():
+        if name not in results['scenarios']:
+            continue
+        current = results['scenarios'][name]
+
+        if current['steps_per_second'] < base['steps_per_second'] * (1 - threshold):
+            failures.append(f'{name}: {current["steps_per_second"]:.0f} steps/s, '
+                            f'baseline {base["steps_per_second"]:.0f} steps/s')
+        for key in ('apoapsis_height', 'periapsis_height'):
+            if abs(current[key] - base[key]) > tolerance:
+                failures.append(f'{name}: {key} {current[key]:.3f} m, baseline {base[key]:.3f} m')
+    return failures
+
+
+def print_results(results):
+    for name, result in results['scenarios'].items():
+        print(f'{name}: {result["steps"]} steps in {result["wall_time"]:.2f}s - '
+              f'{result["steps_per_second"]:.0f} steps/s, peak memory {result["peak_memory"] / 1024 ** 2:.1f} MB')
+        print(f'    apoapsis {result["apoapsis_height"] / 1000:.3f} km, periapsis '
+              f'{result["periapsis_height"] / 1000:.3f} km, fuel left {result["fuel_left"]:.2f} kg')
+        for function, seconds in sorted(result['function_times'].items(), key=lambda item: -item[1]):
+            print(f'    {function}: {seconds:.3f}s (profiled)')
+    for name, microseconds in results['micro'].items():
+        print(f'{name}: {microseconds:.3f} us')
+    if results['plotter']:
+        print(f'Plotter: setup {results["plotter"]["init_time"]:.3f}s, frame {results["plotter"]["frame_time"]:.3f}s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--save', help='write the results as json baseline')
+    parser.add_argument('--compare', help='json baseline to check the results against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed fraction of lost steps per second')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='allowed change of the final orbit in m')
+    parser.add_argument('--no-profile', action='store_true', help='skip the per function times')
+    args = parser.parse_args(argv)
+
+    results = run_all(not args.no_profile)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failures = compare(results, baseline, args.threshold, args.tolerance)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
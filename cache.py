@@ -0,0 +1,119 @@
+import functools
+import hashlib
+import json
+import os
+import zipfile
+
+import numpy as np
+
+import flight_sim
+import physics
+from trajectory import Trajectory, STATE_FIELDS
+
+# source files whose content changes the simulation result
+MODEL_FILES = ('physics.py', 'environment.py', 'orbit.py', 'stage.py', 'vehicle.py', 'flight_sim.py', 'integrators.py',
+               'kernels.py')
+
+
+@functools.lru_cache(maxsize=None)
+def physics_fingerprint():
+    """Hash of the physical constants and the source of the model, computed once per process."""
+    digest = hashlib.sha256()
+    constants = {name: getattr(physics, name) for name in
+                 ('gravitational_constant', 'earth_mass', 'earth_radius', 'k', 'sigma')}
+    constants['effective_area'] = flight_sim.effective_area
+    constants['effective_nose_radius'] = flight_sim.effective_nose_radius
+    digest.update(json.dumps(constants, sort_keys=True).encode())
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in MODEL_FILES:
+        with open(os.path.join(directory, filename), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def simulation_key(sim):
+    """Stable hash of every input of the simulation that affects its result."""
+    inputs = {
+        # the compiled vehicle, the stages may have changed since the simulation was set up
+        'vehicle': [[list(schedule) for schedule in sim.vehicle.schedules], sim.vehicle.final_dry_mass],
+        'gravity_turn': [sim.gravity_turn.start, sim.gravity_turn.end, sim.gravity_turn.angle],
+        'target_orbit': sim.target_orbit,
+        'circularize': sim.circ,
+        'time_step': sim.time_step,
+        'integrator': [sim.integrator, sim.rtol, sim.atol, repr(sim.max_step)],
+        'coast': [sim.kepler_coast, sim.coast_output_interval],
+        'environment': [repr(sim.atmosphere), repr(sim.gravity)],
+        'physics': physics_fingerprint(),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+class SimulationCache:
+    """Stores simulation results on disk, keyed by the hash of the simulation inputs.
+
+    Results are kept as compressed numpy archives of the trajectory state columns. When the total size
+    of the cache exceeds max_size bytes the least recently used results are removed.
+    """
+
+    def __init__(self, directory='.flight_sim_cache', max_size=512 * 1024 ** 2):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def simulate(self, sim):
+        """Returns the cached result of the simulation, runs and stores it if it is not cached yet."""
+        path = os.path.join(self.directory, simulation_key(sim) + '.npz')
+        result = self._load(path, sim)
+        if result is not None:
+            return result
+
+        result = sim.simulate()
+        self._store(path, sim, result)
+        self._evict()
+        return result
+
+    def clear(self):
+        for filename in self._entries():
+            os.remove(os.path.join(self.directory, filename))
+
+    def _load(self, path, sim):
+        try:
+            with np.load(path) as data:
+                columns = {name: data[name] for name in STATE_FIELDS}
+                result = Trajectory.from_columns(columns, data['description'])
+                sim.loss_gravity, sim.loss_drag, sim.deltaV = (float(value) for value in data['losses'])
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # a truncated or corrupt entry is a miss, it is replaced by the new result
+            os.remove(path)
+            return None
+
+        # mark the entry as recently used
+        os.utime(path)
+        return result
+
+    def _store(self, path, sim, result):
+        columns = {name: getattr(result, name) for name in STATE_FIELDS}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, description=result.description_codes,
+                     losses=np.array([sim.loss_gravity, sim.loss_drag, sim.deltaV]), **columns)
+        os.replace(tmp_path, path)
+
+    def _entries(self):
+        return [filename for filename in os.listdir(self.directory) if filename.endswith('.npz')]
+
+    def _evict(self):
+        entries = []
+        for filename in self._entries():
+            stat = os.stat(os.path.join(self.directory, filename))
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            os.remove(os.path.join(self.directory, filename))
+            total_size -= size
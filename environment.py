@@ -0,0 +1,242 @@
+import bisect
+import math
+
+import numpy as np
+
+import physics
+
+# US standard atmosphere 1976
+standard_gravity = 9.80665  # m/s^2
+specific_gas_constant = 287.053  # J/(kg K), dry air
+standard_earth_radius = 6356766  # m, used for the geopotential height
+
+# layers of the standard atmosphere: base geopotential height in m, base temperature in K,
+# temperature lapse rate in K/m and base pressure in Pa
+STANDARD_LAYERS = (
+    (0, 288.15, -0.0065, 101325),
+    (11000, 216.65, 0, 22632.06),
+    (20000, 216.65, 0.001, 5474.889),
+    (32000, 228.65, 0.0028, 868.0187),
+    (47000, 270.65, 0, 110.9063),
+    (51000, 270.65, -0.0028, 66.93887),
+    (71000, 214.65, -0.002, 3.956420),
+    (84852, 186.946, 0, 0.3733836),
+)
+
+
+class AtmosphereModel:
+    """Air density as a function of the height above the surface.
+
+    density takes a single height, densities an array of heights. A model with values per lane of a
+    BatchFlightSim returns the model of some of the lanes from for_lanes.
+    """
+
+    def density(self, height):
+        raise NotImplementedError
+
+    def densities(self, heights):
+        return np.array([self.density(h) for h in np.ravel(heights)]).reshape(np.shape(heights))
+
+    def for_lanes(self, lanes):
+        return self
+
+
+class GravityModel:
+    """Gravitational acceleration as a function of the height above the surface.
+
+    acceleration takes a single height, accelerations an array of heights. A model with values per
+    lane of a BatchFlightSim returns the model of some of the lanes from for_lanes.
+    """
+
+    def acceleration(self, height):
+        raise NotImplementedError
+
+    def accelerations(self, heights):
+        return np.array([self.acceleration(h) for h in np.ravel(heights)]).reshape(np.shape(heights))
+
+    def for_lanes(self, lanes):
+        return self
+
+
+class ExponentialAtmosphere(AtmosphereModel):
+    """Exponential density decay, the model of Physics.atmospheric_density."""
+
+    def __init__(self, surface_density=1.2, decay=1.244268 * (10 ** -4)):
+        self.surface_density = surface_density
+        self.decay = decay
+        self._exponent = -decay
+
+    def __repr__(self):
+        return f'ExponentialAtmosphere({self.surface_density!r}, {self.decay!r})'
+
+    def density(self, height):
+        return self.surface_density * math.e ** (self._exponent * height)
+
+    def densities(self, heights):
+        return self.surface_density * math.e ** (self._exponent * np.asarray(heights))
+
+
+class StandardAtmosphere(AtmosphereModel):
+    """US standard atmosphere 1976 built from its temperature layers.
+
+    Above the last layer the density decays exponentially with the scale height of that layer.
+    """
+
+    def __init__(self, layers=STANDARD_LAYERS):
+        self.layers = layers
+        self._base_heights = [layer[0] for layer in layers]
+        self._base, self._temperature, self._lapse_rate, self._pressure = (np.array(column, dtype=float)
+                                                                           for column in zip(*layers))
+
+    def __repr__(self):
+        return f'StandardAtmosphere({self.layers!r})'
+
+    def density(self, height):
+        # geopotential height
+        h = standard_earth_radius * height / (standard_earth_radius + height)
+        i = max(0, bisect.bisect_right(self._base_heights, h) - 1)
+        base, temperature, lapse_rate, pressure = self.layers[i]
+
+        if lapse_rate == 0:
+            temperature_at_height = temperature
+            pressure *= math.exp(-standard_gravity * (h - base) / (specific_gas_constant * temperature))
+        else:
+            temperature_at_height = temperature + lapse_rate * (h - base)
+            pressure *= (temperature / temperature_at_height) ** (
+                    standard_gravity / (specific_gas_constant * lapse_rate))
+        return pressure / (specific_gas_constant * temperature_at_height)
+
+    def densities(self, heights):
+        heights = np.asarray(heights, dtype=float)
+        h = standard_earth_radius * heights / (standard_earth_radius + heights)
+        i = np.maximum(0, np.searchsorted(self._base, h, side='right') - 1)
+        base, temperature, lapse_rate, pressure = (column[i] for column in (self._base, self._temperature,
+                                                                             self._lapse_rate, self._pressure))
+
+        isothermal = lapse_rate == 0
+        safe_lapse_rate = np.where(isothermal, 1, lapse_rate)
+        temperature_at_height = np.where(isothermal, temperature, temperature + lapse_rate * (h - base))
+        pressure = pressure * np.where(
+            isothermal,
+            np.exp(-standard_gravity * (h - base) / (specific_gas_constant * temperature)),
+            (temperature / temperature_at_height) ** (standard_gravity / (specific_gas_constant * safe_lapse_rate)))
+        return pressure / (specific_gas_constant * temperature_at_height)
+
+
+class ScaledAtmosphere(AtmosphereModel):
+    """Density of another model multiplied by a scale factor.
+
+    For a BatchFlightSim the scale can be an array with a factor per lane.
+    """
+
+    def __init__(self, model, scale):
+        self.model = model
+        self.scale = scale
+
+    def __repr__(self):
+        return f'ScaledAtmosphere({self.model!r}, {np.asarray(self.scale).tolist()!r})'
+
+    def density(self, height):
+        return self.scale * self.model.density(height)
+
+    def densities(self, heights):
+        return self.scale * self.model.densities(heights)
+
+    def for_lanes(self, lanes):
+        if np.ndim(self.scale) == 0:
+            return ScaledAtmosphere(self.model.for_lanes(lanes), self.scale)
+        return ScaledAtmosphere(self.model.for_lanes(lanes), np.asarray(self.scale)[lanes])
+
+
+class InverseSquareGravity(GravityModel):
+    """Point mass gravity, the model of Physics.gravitational_acceleration."""
+
+    def __init__(self, mu=physics.gravitational_constant * physics.earth_mass, radius=physics.earth_radius):
+        self.mu = mu
+        self.radius = radius
+
+    def __repr__(self):
+        return f'InverseSquareGravity({self.mu!r}, {self.radius!r})'
+
+    def acceleration(self, height):
+        return self.mu / ((self.radius + height) ** 2)
+
+    def accelerations(self, heights):
+        return self.mu / ((self.radius + np.asarray(heights)) ** 2)
+
+
+class _HeightTable:
+    """Linear interpolation of a function of the height on an evenly spaced grid."""
+
+    def __init__(self, function, vectorized_function, max_height, step):
+        self.function = function
+        self.vectorized_function = vectorized_function
+        self.max_height = max_height
+        self.step = step
+
+        grid = np.arange(0, max_height + step, step)
+        values = vectorized_function(grid)
+        self._values = values
+        self._slopes = np.diff(values)
+        # python lists are faster than numpy arrays for single lookups
+        self._value_list = values.tolist()
+        self._slope_list = self._slopes.tolist()
+
+    def value(self, height):
+        x = height / self.step
+        i = int(x)
+        if 0 <= x and i < len(self._slope_list):
+            return self._value_list[i] + (x - i) * self._slope_list[i]
+        # outside of the table
+        return self.function(height)
+
+    def values(self, heights):
+        heights = np.asarray(heights, dtype=float)
+        x = heights / self.step
+        i = np.clip(x.astype(int), 0, len(self._slopes) - 1)
+        result = self._values[i] + (x - i) * self._slopes[i]
+        outside = (x < 0) | (x >= len(self._slopes))
+        if outside.any():
+            result = np.where(outside, self.vectorized_function(heights), result)
+        return result
+
+
+class TabulatedAtmosphere(AtmosphereModel):
+    """Precomputed density table of another atmosphere model, interpolated linearly in height.
+
+    A lookup costs more than the closed form of ExponentialAtmosphere, the table only pays off for models
+    that are expensive to evaluate like StandardAtmosphere, see the micro benchmarks of benchmark.py.
+    """
+
+    def __init__(self, model=None, max_height=1000000, step=20):
+        self.model = model or ExponentialAtmosphere()
+        self._table = _HeightTable(self.model.density, self.model.densities, max_height, step)
+
+    def __repr__(self):
+        return f'TabulatedAtmosphere({self.model!r}, {self._table.max_height!r}, {self._table.step!r})'
+
+    def density(self, height):
+        return self._table.value(height)
+
+    def densities(self, heights):
+        return self._table.values(heights)
+
+
+class TabulatedGravity(GravityModel):
+    """Precomputed acceleration table of another gravity model, interpolated linearly in height.
+
+    Like TabulatedAtmosphere it only pays off for models more expensive than InverseSquareGravity.
+    """
+
+    def __init__(self, model=None, max_height=1000000, step=20):
+        self.model = model or InverseSquareGravity()
+        self._table = _HeightTable(self.model.acceleration, self.model.accelerations, max_height, step)
+
+    def __repr__(self):
+        return f'TabulatedGravity({self.model!r}, {self._table.max_height!r}, {self._table.step!r})'
+
+    def acceleration(self, height):
+        return self._table.value(height)
+
+    def accelerations(self, heights):
+        return self._table.values(heights)
@@ -1,15 +1,33 @@
-import copy
 import math
+from collections import namedtuple
+
+import numpy as np
 
 from physics import Physics, earth_radius
 from dataclasses import dataclass
 
+from environment import ExponentialAtmosphere, InverseSquareGravity
+from integrators import RK4, RK45, counting, find_event
 from orbit import Orbit
+from trajectory import Trajectory, STATE_FIELDS, DESCRIPTIONS, DESCRIPTION_CODES
+from vehicle import Vehicle
 
 # constants for this simulation
 effective_area = 0.41  # m^2
 effective_nose_radius = 0.5  # m
 
+# drag acceleration in m/s^2 below which the coast follows the Kepler orbit, see FlightSim(kepler_coast=True)
+KEPLER_DRAG_LIMIT = 1e-5
+
+# seconds the coast of the higher order integrators may take longer than the Kepler orbit to reach apoapsis
+COAST_TIME_MARGIN = 60
+
+# number of steps the kernels record before their states are passed on
+CHUNK_SIZE = 4096
+
+# layout of the state vector used by the higher order integrators
+V, H, GAMMA, LOCAL_HORIZON, M, LOSS_GRAVITY, LOSS_DRAG, DELTA_V = range(8)
+
 class GravityTurn:
     """Defines the start, end, and angle of a gravity turn."""
     def __init__(self, start, end, angle):
@@ -33,74 +51,351 @@ class State:
     description = ''
 
 
+# snapshot of a simulation during an event: the phase and position the simulation resumes at, the
+# values of the state and the totals of the simulation
+Checkpoint = namedtuple('Checkpoint', ('phase', 'stage_index', 'stage_time', 'previous_h', 'state', 'loss_gravity',
+                                       'loss_drag', 'deltaV', 'evaluations'))
+# phases a checkpoint resumes in: before the ignition of a stage, during its burn, during the coast to apoapsis,
+# before the circularization burn or after the flight
+PHASES = ('ignition', 'ascent', 'coast', 'circularization', 'finished')
+
+
 class FlightSim:
     """Simulates a rocket launch and ascent."""
     loss_gravity = 0
     loss_drag = 0
     deltaV = 0
 
-    def __init__(self, stages, gravity_turn: GravityTurn, target_orbit=0, circularize=False, time_step=0.02):
+    def __init__(self, stages, gravity_turn: GravityTurn, target_orbit=0, circularize=False, time_step=0.02,
+                 integrator='euler', rtol=1e-8, atol=1e-6, max_step=math.inf, atmosphere=None, gravity=None,
+                 hooks=(), logger=None, verbose=True, backend='python', kepler_coast=False, coast_output_interval=None):
+        """The integrator is one of 'euler' (fixed step), 'rk4' (fixed step with located events) or
+        'rk45' (Dormand-Prince with step size control and located events). For 'rk45' the time step
+        is only the initial step size and rtol, atol and max_step control the step size.
+
+        atmosphere and gravity are models from the environment module, by default the exponential
+        atmosphere and inverse square gravity of Physics.
+
+        hooks are SimulationHooks from the instrumentation module. Progress messages are printed, or
+        passed to the logger with the event and its values as extra fields if one is given. With
+        verbose=False they are dropped.
+
+        backend='kernels' runs the euler integrator on the flat state vector of the kernels module,
+        compiled with numba if it is installed, with the same results as the python backend.
+
+        With kepler_coast the coast to apoapsis jumps along the Kepler orbit once the drag is below
+        KEPLER_DRAG_LIMIT, yielding states coast_output_interval seconds apart (if given) and at apoapsis."""
+        if integrator not in ('euler', 'rk4', 'rk45'):
+            raise ValueError(f'unknown integrator {integrator}')
+        if backend not in ('python', 'kernels'):
+            raise ValueError(f'unknown backend {backend}')
+        if backend == 'kernels' and integrator != 'euler':
+            raise ValueError('the kernels backend only supports the euler integrator')
+        if kepler_coast and (integrator != 'euler' or backend != 'python'):
+            raise ValueError('only the python euler simulation coasts along the Kepler orbit')
+
         self.stages = stages
+        self.vehicle = Vehicle(stages)
         self.time_step = time_step
         self.gravity_turn = gravity_turn
         self.circ = circularize
         self.target_orbit = target_orbit
+        self.integrator = integrator
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.atmosphere = atmosphere or ExponentialAtmosphere()
+        self.gravity = gravity or InverseSquareGravity()
+        self._environment_height = None
+        self.hooks = list(hooks)
+        self.logger = logger
+        self.verbose = verbose
+        self.evaluations = 0  # evaluations of the forces
+        self._totals = 0, 0, 0, 0  # losses and evaluations before the integrator of _event_steps started
+        self.backend = backend
+        self.kepler_coast = kepler_coast
+        self.coast_output_interval = coast_output_interval
+        self._event_position = None
 
-    def simulate(self):
-        """Runs the simulation and returns the flight states."""
-        simulation_states = []
+    def simulate(self, start=None):
+        """Runs the simulation and returns the flight states as a Trajectory.
 
+        With a start checkpoint the flight continues after the event of the checkpoint and only the
+        states after it are returned, see checkpoint.
+        """
+        if self.backend == 'kernels' and not self.hooks and start is None:
+            # no hooks to call for every state, so the rows of the kernels become the columns
+            return self._kernel_trajectory()
+        simulation_states = Trajectory()
+        for state in self.simulate_iter(start=start):
+            # the trajectory stores a copy of the values
+            simulation_states.append(state)
+        return simulation_states
+
+    def simulate_iter(self, output_interval=None, start=None):
+        """Runs the simulation and yields the flight states as they are computed.
+
+        The same State object is updated and yielded again for every step, copy it to keep its
+        values. With an output interval in seconds only states at least that far apart are
+        yielded, independent of the time step. The first state of every flight phase and the
+        final state are always yielded.
+        """
+        if start is not None:
+            if not self.resumable:
+                raise ValueError('only the python euler simulation resumes from checkpoints')
+            steps = self._euler_steps(start)
+        elif self.integrator != 'euler':
+            steps = self._event_steps()
+        elif self.backend == 'kernels':
+            steps = self._kernel_steps()
+        else:
+            steps = self._euler_steps()
+        if output_interval is None:
+            yield from steps
+            return
+
+        next_output = 0
+        description = None
+        state = None
+        for state in steps:
+            if state.t >= next_output or state.description != description:
+                next_output = state.t + output_interval
+                description = state.description
+                yield state
+                state = None
+        if state is not None:
+            yield state
+
+    def simulate_to(self, sink, output_interval=None, start=None):
+        """Runs the simulation and writes the flight states to the sink, see the sinks module."""
+        try:
+            for state in self.simulate_iter(output_interval, start):
+                sink.write(state)
+        finally:
+            sink.close()
+        return sink
+
+    def _euler_steps(self, start=None):
+        """Runs the fixed step simulation, yields the state after every step.
+
+        Starts on the pad, or where the start checkpoint was taken.
+        """
         state = State()
+        phase, first, stage_time, previous_h = 'ignition', 0, 0, None
+        if start is not None:
+            phase, first, stage_time, previous_h = self._restore(start, state)
         state.orbit = Orbit(state.h, state.v, state.gamma)
+        if start is not None:
+            self._notify('on_resume', state, phase, first)
 
         # ascent phase
-        for i, stage in enumerate(self.stages):
-            stage_time = 0
-            print(f'Igniting stage {i + 1} after {state.t}s - {stage.burn_time}s burn time')
-
-            # calculate the mass of the rest of the rocket
-            eff_payload_mass = sum(s.mass_at_time(0) for s in self.stages[i + 1:])
-            last_stage = i == len(self.stages) - 1
+        for i in range(first, len(self.vehicle)):
+            stage = self.vehicle.schedules[i]
+            last_stage = i == len(self.vehicle) - 1
+            if phase == 'ignition':
+                stage_time = 0
+                self._log('ignition', f'Igniting stage {i + 1} after {state.t}s - {stage.burn_time}s burn time',
+                          t=state.t, stage=i + 1, burn_time=stage.burn_time)
+                self._event('on_stage_ignition', state, ('ascent', i, stage_time, None), i)
+                phase = 'ascent'
+            elif phase != 'ascent':
+                # resumed after main engine cutoff
+                if phase != 'finished':
+                    yield from self.circularize(state, stage, stage_time, previous_h, phase == 'coast')
+                break
 
             # iterate through burn time
             while stage_time < stage.burn_time:
-                self.advance_state(state, stage, stage_time, eff_payload_mass)
+                previous_h, previous_eccentricity = state.h, state.orbit.eccentricity
+                self.advance_state(state, stage, stage_time)
                 state.description = 'Ascent'
-
-                # copy the state so it is not just a reference
-                simulation_states.append(copy.deepcopy(state))
+                for hook in self.hooks:
+                    hook.on_step(self, state)
+                yield state
                 stage_time += self.time_step
 
                 # handle engine shutdown on the last stage
                 if last_stage:
                     if state.orbit.apoapsis_height >= self.target_orbit:
                         if self.circ:
-                            print(f'Apoapsis at target height - shutting off at [{state.t}s]')
-                            self.circularize(state, stage, stage_time, eff_payload_mass, simulation_states)
+                            self._log('meco', f'Apoapsis at target height - shutting off at [{state.t}s]', t=state.t)
+                            self._event('on_meco', state, ('coast', i, stage_time, previous_h))
+                            yield from self.circularize(state, stage, stage_time, previous_h)
                             break
-                        elif simulation_states[-2].orbit.eccentricity < state.orbit.eccentricity:
+                        elif previous_eccentricity < state.orbit.eccentricity:
                             # break when orbit eccentricity starts to increase again
-                            print(f'Periapsis at target height - shutting off at [{state.t}s]')
+                            self._log('meco', f'Periapsis at target height - shutting off at [{state.t}s]', t=state.t)
+                            self._event('on_meco', state, ('finished', i, stage_time, None))
                             break
+            else:
+                self._event('on_burnout', state, ('ignition', i + 1, 0, None), i)
+                phase = 'ignition'
 
-        print(f'Loss due to gravity: {self.loss_gravity} m/s')
-        print(f'Loss due to drag: {self.loss_drag} m/s')
-        print(f'Total deltaV: {self.deltaV} m/s')
-        print(f'Fuel left: {state.m - (self.stages[-1].payload_mass + self.stages[-1].structure_mass) * 1000} kg')
+        self._finish(state)
 
-        return simulation_states
+    @property
+    def resumable(self):
+        """Whether the simulation takes checkpoints and resumes from them, only the python euler simulation does."""
+        return self.integrator == 'euler' and self.backend == 'python'
+
+    def checkpoint(self):
+        """Takes a snapshot of the simulation during an event, e.g. from the on_burnout callback of a hook.
 
-    def advance_state(self, state, stage, stage_time, eff_payload_mass, engines_on=True):
-        """Advances the state by one time step."""
+        A simulation given the checkpoint as start continues right after the event, with the stages,
+        state and losses of the checkpoint. It may use another target orbit or circularization, so
+        flights that only differ after the event share the computation up to it. Only the python
+        euler simulation takes checkpoints.
+        """
+        if self._event_position is None:
+            raise ValueError('checkpoints are only taken during the events of the python euler simulation')
+        (phase, stage_index, stage_time, previous_h), state = self._event_position
+        values = {name: getattr(state, name) for name in STATE_FIELDS}
+        values['description'] = state.description
+        return Checkpoint(phase, stage_index, stage_time, previous_h, values, self.loss_gravity, self.loss_drag,
+                          self.deltaV, self.evaluations)
+
+    def _restore(self, start, state):
+        """Copies the values of the checkpoint into the state and the totals, returns its position."""
+        if start.phase not in PHASES or not 0 <= start.stage_index <= len(self.vehicle):
+            raise ValueError(f'checkpoint at {start.phase} of stage {start.stage_index} does not fit the vehicle')
+        for name, value in start.state.items():
+            setattr(state, name, value)
+        self.loss_gravity, self.loss_drag, self.deltaV = start.loss_gravity, start.loss_drag, start.deltaV
+        self.evaluations = start.evaluations
+        return start.phase, start.stage_index, start.stage_time, start.previous_h
+
+    def _kernel_steps(self):
+        """Runs the fixed step simulation with the kernels, yields the state after every step."""
+        import kernels  # imports numba if it is installed
+
+        state = State()
+        state.orbit = Orbit(state.h, state.v, state.gamma)
+        for item in self._kernel_chunks():
+            if item[0] == 'event':
+                self._notify(item[1], state, *item[2:])
+                continue
+
+            _, rows, codes = item
+            for row, code in zip(rows.tolist(), codes.tolist()):
+                state.t, state.v, state.m, state.h, state.gamma, state.a, state.temp, state.local_horizon = \
+                    row[:kernels.LOSS_GRAVITY]
+                state.orbit.update(state.h, state.v, state.gamma)
+                state.description = DESCRIPTIONS[code]
+                self.loss_gravity, self.loss_drag, self.deltaV = row[kernels.LOSS_GRAVITY:]
+                for hook in self.hooks:
+                    hook.on_step(self, state)
+                yield state
+        self._finish(state)
+
+    def _kernel_trajectory(self):
+        """Runs the fixed step simulation with the kernels and returns the states as a Trajectory."""
+        import kernels
+
+        chunks = [(item[1].copy(), item[2].copy()) for item in self._kernel_chunks() if item[0] == 'rows']
+        if chunks:
+            rows = np.concatenate([rows for rows, _ in chunks])
+            codes = np.concatenate([codes for _, codes in chunks])
+        else:
+            rows, codes = np.empty((0, kernels.STATE_SIZE)), np.empty(0, dtype=np.int8)
+        trajectory = Trajectory.from_columns({name: rows[:, i] for i, name in enumerate(STATE_FIELDS)}, codes)
+        self._finish(trajectory[-1] if len(trajectory) else State())
+        return trajectory
+
+    def _kernel_chunks(self):
+        """Runs the kernels, yields ('rows', rows, codes) with the state vectors of the steps and
+        ('event', callback, *args) for the hooks in between. The arrays are reused for the next rows."""
+        import kernels
+
+        p = kernels.parameters(self, effective_area, effective_nose_radius)
+        x = kernels.initial_state(self.loss_gravity, self.loss_drag, self.deltaV)
+        rows, codes = kernels.buffers(CHUNK_SIZE)
+        ascent, coast, circularizing = (DESCRIPTION_CODES[description] for description in
+                                        ('Ascent', 'Waiting for apoapsis', 'Circularizing'))
+        count = 0
+        last = len(self.vehicle) - 1
+
+        def flush():
+            nonlocal count
+            if count:
+                self.evaluations += count
+                self.loss_gravity, self.loss_drag, self.deltaV = (float(x[i]) for i in
+                                                                  (kernels.LOSS_GRAVITY, kernels.LOSS_DRAG,
+                                                                   kernels.DELTA_V))
+                yield 'rows', rows[:count], codes[:count]
+                count = 0
+
+        # ascent phase
+        for i, stage in enumerate(self.vehicle.schedules):
+            t = float(x[kernels.TIME])
+            self._log('ignition', f'Igniting stage {i + 1} after {t}s - {stage.burn_time}s burn time',
+                      t=t, stage=i + 1, burn_time=stage.burn_time)
+            yield from flush()
+            yield 'event', 'on_stage_ignition', i
+
+            if i < last:
+                shutdown = kernels.NO_SHUTDOWN
+            else:
+                shutdown = kernels.APOAPSIS_AT_TARGET if self.circ else kernels.PERIAPSIS_AT_TARGET
+            stage_time = 0.0
+            status = kernels.BUFFER_FULL
+            while status == kernels.BUFFER_FULL:
+                if count == CHUNK_SIZE:
+                    yield from flush()
+                count, stage_time, previous_h, status = kernels.burn(
+                    x, rows, codes, count, stage_time, stage.burn_time, stage.thrust, stage.upper_mass,
+                    stage.start_mass, stage.mass_flux, shutdown, ascent, p)
+            yield from flush()
+            if status == kernels.FINISHED:
+                yield 'event', 'on_burnout', i
+                continue
+
+            t = float(x[kernels.TIME])
+            if not self.circ:
+                self._log('meco', f'Periapsis at target height - shutting off at [{t}s]', t=t)
+                yield 'event', 'on_meco'
+                break
+            self._log('meco', f'Apoapsis at target height - shutting off at [{t}s]', t=t)
+            yield 'event', 'on_meco'
+            if self.target_orbit <= 0:
+                break
+
+            # coast to apoapsis
+            status = kernels.BUFFER_FULL
+            while status == kernels.BUFFER_FULL:
+                if count == CHUNK_SIZE:
+                    yield from flush()
+                count, previous_h, status = kernels.coast(x, rows, codes, count, previous_h, stage.thrust, coast,
+                                                          p)
+            yield from flush()
+            t, h = float(x[kernels.TIME]), float(x[kernels.H])
+            self._log('apoapsis', f'Apoapsis reached: {round(h / 1000, 1)} km - circularizing [{t}s]', t=t, h=h)
+            yield 'event', 'on_circularization'
+
+            # circularization burn
+            status = kernels.BUFFER_FULL
+            while status == kernels.BUFFER_FULL:
+                if count == CHUNK_SIZE:
+                    yield from flush()
+                count, stage_time, previous_h, status = kernels.burn(
+                    x, rows, codes, count, stage_time, stage.burn_time, stage.thrust, stage.upper_mass,
+                    stage.start_mass, stage.mass_flux, kernels.ECCENTRICITY_MINIMUM, circularizing, p)
+            yield from flush()
+            if status == kernels.FINISHED:
+                yield 'event', 'on_burnout', i
+
+    def advance_state(self, state, stage, stage_time, engines_on=True):
+        """Advances the state by one time step, stage is the StageSchedule of the vehicle."""
         if engines_on:
-            state.m = eff_payload_mass + stage.mass_at_time(stage_time)
-            stage_time += self.time_step
+            state.m = stage.upper_mass + (stage.start_mass - stage.mass_flux * stage_time)
 
         thrust = stage.thrust if engines_on else 0
-        state.v += Physics.acceleration_in_dir_of_flight(thrust, state, effective_area, self) * self.time_step
+        density, gravity = self.environment(state.h)
+        state.v += Physics.acceleration_in_dir_of_flight(thrust, state, effective_area, self, density,
+                                                         gravity) * self.time_step
         state.h += state.v * math.cos(math.pi / 2 - state.gamma) * self.time_step
-        state.gamma += Physics.angular_velocity(stage.thrust, state) * self.time_step
-        state.temp = Physics.max_temperature(state.v, state.h, effective_nose_radius)
+        density, gravity = self.environment(state.h)
+        state.gamma += Physics.angular_velocity(stage.thrust, state, gravity) * self.time_step
+        state.temp = Physics.max_temperature(state.v, state.h, effective_nose_radius, density=density)
         state.t += self.time_step
         state.orbit.update(state.h, state.v, state.gamma)
 
@@ -112,26 +407,322 @@ class FlightSim:
 
         # update local horizon angle
         state.local_horizon += math.atan(state.v * self.time_step * math.cos(state.gamma) / (earth_radius + state.h))
+        self.evaluations += 1
+
+    def environment(self, h):
+        """Returns the air density and gravitational acceleration at the given height.
 
-    def circularize(self, state, stage, stage_time, eff_payload_mass, simulation_states):
-        """Performs orbit circularization at apoapsis."""
+        The values of the last height are kept, so that the models are evaluated once per step.
+        """
+        if h != self._environment_height:
+            self._environment_height = h
+            self._environment = self.atmosphere.density(h), self.gravity.acceleration(h)
+        return self._environment
+
+    def circularize(self, state, stage, stage_time, previous_h, coast=True):
+        """Performs orbit circularization at apoapsis, yields the state after every step.
+
+        previous_h is the height before the last step. Without coast the rocket is already at apoapsis.
+        """
         if self.target_orbit <= 0:
             return
 
-        # coast to apoapsis
-        while state.h > simulation_states[-2].h:
-            self.advance_state(state, stage, 0, 0, False)
-            state.description = 'Waiting for apoapsis'
-            simulation_states.append(copy.deepcopy(state))
+        if coast:
+            # coast to apoapsis
+            while state.h > previous_h:
+                if self.kepler_coast and self._drag_negligible(state):
+                    yield from self._kepler_coast(state)
+                    break
+                previous_h = state.h
+                self.advance_state(state, stage, 0, False)
+                state.description = 'Waiting for apoapsis'
+                for hook in self.hooks:
+                    hook.on_step(self, state)
+                yield state
 
-        print(f'Apoapsis reached: {round(state.h / 1000, 1)} km - circularizing [{state.t}s]')
+            self._log('apoapsis', f'Apoapsis reached: {round(state.h / 1000, 1)} km - circularizing [{state.t}s]',
+                      t=state.t, h=state.h)
+            self._event('on_circularization', state, ('circularization', len(self.vehicle) - 1, stage_time, None))
 
         # perform circularization burn
         while stage_time < stage.burn_time:
-            self.advance_state(state, stage, stage_time, eff_payload_mass)
+            previous_eccentricity = state.orbit.eccentricity
+            self.advance_state(state, stage, stage_time)
             stage_time += self.time_step
             state.description = 'Circularizing'
-            simulation_states.append(copy.deepcopy(state))
+            for hook in self.hooks:
+                hook.on_step(self, state)
+            yield state
+
+            if previous_eccentricity < state.orbit.eccentricity:
+                break
+        else:
+            self._event('on_burnout', state, ('finished', len(self.vehicle) - 1, stage_time, None),
+                        len(self.vehicle) - 1)
+
+    def _drag_negligible(self, state):
+        """Whether the rocket follows its Kepler orbit: elliptic, pointing along the flight path and no drag."""
+        if state.a != 0 or not state.orbit.eccentricity < 1:
+            return False
+        density, _ = self.environment(state.h)
+        return density * (state.v ** 2) * effective_area * 0.5 / state.m < KEPLER_DRAG_LIMIT
+
+    def _kepler_coast(self, state):
+        """Coasts to apoapsis along the Kepler orbit, yields the states at the output interval and at apoapsis."""
+        orbit = Orbit(state.h, state.v, state.gamma)
+        t, v, local_horizon, loss_gravity = state.t, state.v, state.local_horizon, self.loss_gravity
+        duration = orbit.time_to_apoapsis()
+        times = [duration]
+        if self.coast_output_interval:
+            times = np.arange(self.coast_output_interval, duration, self.coast_output_interval).tolist() + times
+
+        for time in times:
+            state.h, state.v, state.gamma, angle = orbit.propagate(time)
+            state.t = t + time
+            state.local_horizon = local_horizon + angle
+            state.a = self._turn_angle(state.h)
+            density, _ = self.environment(state.h)
+            state.temp = Physics.max_temperature(state.v, state.h, effective_nose_radius, density=density)
+            state.orbit.update(state.h, state.v, state.gamma)
+            state.description = 'Waiting for apoapsis'
+            # without drag and thrust gravity takes the lost velocity
+            self.loss_gravity = loss_gravity + v - state.v
+            for hook in self.hooks:
+                hook.on_step(self, state)
+            yield state
+
+    def _log(self, event, message, **values):
+        if self.logger is not None:
+            self.logger.info(message, extra={'event': event, **values})
+        elif self.verbose:
+            print(message)
+
+    def _notify(self, callback, state, *args):
+        for hook in self.hooks:
+            getattr(hook, callback)(self, state, *args)
+
+    def _event(self, callback, state, position, *args):
+        """Notifies the hooks of an event, a checkpoint taken by them resumes at the position."""
+        self._event_position = position, state
+        try:
+            self._notify(callback, state, *args)
+        finally:
+            self._event_position = None
+
+    def _finish(self, state):
+        """Reports the losses and the fuel left at the end of the flight."""
+        fuel_left = state.m - self.vehicle.final_dry_mass
+        self._notify('on_finish', state)
+        self._log('summary', f'Loss due to gravity: {self.loss_gravity} m/s', loss_gravity=self.loss_gravity)
+        self._log('summary', f'Loss due to drag: {self.loss_drag} m/s', loss_drag=self.loss_drag)
+        self._log('summary', f'Total deltaV: {self.deltaV} m/s', deltaV=self.deltaV)
+        self._log('summary', f'Fuel left: {fuel_left} kg', fuel_left=fuel_left)
+
+    def _event_steps(self):
+        """Runs the simulation with a higher order integrator, yields the state after every step.
+
+        Burnout and staging end a step exactly at the burn time. The start and end of the gravity
+        turn, main engine cutoff and apoapsis are located by bisection inside the step in which
+        they occur, so no step straddles a change of the flight equations.
+        """
+        if self.integrator == 'rk4':
+            integrator = RK4(self.time_step)
+        else:
+            integrator = RK45(self.time_step, self.rtol, self.atol, self.max_step)
+        # the losses of the state vector are added to the totals of the simulation
+        self._totals = self.loss_gravity, self.loss_drag, self.deltaV, self.evaluations
+
+        state = State()
+        state.orbit = Orbit(state.h, state.v, state.gamma)
+        y = [state.v, state.h, state.gamma, state.local_horizon, 0, 0, 0, 0]
+        t = 0
+
+        # ascent phase
+        for i, stage in enumerate(self.vehicle.schedules):
+            self._log('ignition', f'Igniting stage {i + 1} after {t}s - {stage.burn_time}s burn time',
+                      t=t, stage=i + 1, burn_time=stage.burn_time)
+            self._notify('on_stage_ignition', state, i)
+
+            y = y[:M] + [float(self.vehicle.ignition_mass[i])] + y[M + 1:]
+            burnout = t + stage.burn_time
+
+            if i < len(self.vehicle) - 1:
+                t, y, _ = yield from self._integrate(integrator, state, t, y, stage, True, burnout, [], 'Ascent')
+                self._notify('on_burnout', state, i)
+                continue
+
+            # shut off at the target apoapsis or where the eccentricity starts to increase again
+            if self.circ:
+                shutdown = self._apoapsis_at_target
+            else:
+                shutdown = self._periapsis_at_target
+            t, y, event = yield from self._integrate(integrator, state, t, y, stage, True, burnout, [shutdown],
+                                                     'Ascent')
+            if event is None:
+                self._notify('on_burnout', state, i)
+                break
+
+            if self.circ:
+                self._log('meco', f'Apoapsis at target height - shutting off at [{t}s]', t=t)
+                self._notify('on_meco', state)
+                if self.target_orbit > 0:
+                    t, y = yield from self._circularize_events(integrator, state, t, y, stage, burnout - t)
+            else:
+                self._log('meco', f'Periapsis at target height - shutting off at [{t}s]', t=t)
+                self._notify('on_meco', state)
+
+        self._finish(state)
+
+    def _circularize_events(self, integrator, state, t, y, stage, remaining_burn_time):
+        """Coasts to apoapsis and performs the circularization burn with the remaining propellant."""
+        t, y, _ = yield from self._integrate(integrator, state, t, y, stage, False, t + self._coast_time_limit(y),
+                                             [self._apoapsis], 'Waiting for apoapsis')
+        self._log('apoapsis', f'Apoapsis reached: {round(y[H] / 1000, 1)} km - circularizing [{t}s]', t=t, h=y[H])
+        self._notify('on_circularization', state)
+
+        t, y, event = yield from self._integrate(integrator, state, t, y, stage, True, t + remaining_burn_time,
+                                                 [self._eccentricity_minimum], 'Circularizing')
+        if event is None:
+            self._notify('on_burnout', state, len(self.vehicle) - 1)
+        return t, y
+
+    def _integrate(self, integrator, state, t, y, stage, engines_on, t_end, events, description):
+        """Integrates until t_end or until one of the events occurs, yields the state after every step.
+
+        Returns the time, the state vector and the event that ended the integration (or None).
+        An event that already occurred at the start ends the integration right away. The gravity
+        turn boundaries are always tracked and only switch the angle of the rocket.
+        """
+        turn_events = [self._turn_start, self._turn_end]
+        a = self._turn_angle(y[H])
+        f = self._flight_equations(stage, engines_on, a)
+        # the event functions evaluate the flight equations as well
+        counted = counting(integrator, f)
+        dt = integrator.initial_step
+        for event in events:
+            if event(y, counted) >= 0:
+                # the state only lacks the ignition mass of a new stage
+                state.m = y[M]
+                self.evaluations = self._totals[3] + integrator.evaluations
+                return t, y, event
+
+        while t_end - t > 1e-9:
+            y_next, dt_taken, dt = integrator.step(f, y, min(dt, t_end - t))
+
+            # locate the earliest event inside the step
+            hit = None
+            for event in events + turn_events:
+                if (event(y, counted) > 0) != (event(y_next, counted) > 0):
+                    dt_event, y_event = find_event(integrator, f, y, dt_taken, event)
+                    if hit is None or dt_event < dt_taken:
+                        hit, dt_taken, y_next = event, dt_event, y_event
+
+            t += dt_taken if t_end - t - dt_taken > 1e-9 else t_end - t
+            y = y_next
+            self._store(state, t, y, a, description)
+            loss_gravity, loss_drag, deltaV, evaluations = self._totals
+            self.loss_gravity = loss_gravity + y[LOSS_GRAVITY]
+            self.loss_drag = loss_drag + y[LOSS_DRAG]
+            self.deltaV = deltaV + y[DELTA_V]
+            self.evaluations = evaluations + integrator.evaluations
+            for hook in self.hooks:
+                hook.on_step(self, state)
+            yield state
+
+            if hit in turn_events:
+                a = self._turn_angle(y[H])
+                f = self._flight_equations(stage, engines_on, a)
+                counted = counting(integrator, f)
+            elif hit is not None:
+                return t, y, hit
+
+        return t, y, None
+
+    def _flight_equations(self, stage, engines_on, a):
+        """Returns the time derivative of the state vector for the given stage and rocket angle."""
+        thrust = stage.thrust if engines_on else 0
+        mass_flux = stage.mass_flux if engines_on else 0
+
+        def f(y):
+            v, h, gamma, m = y[V], y[H], y[GAMMA], y[M]
+            density, g = self.environment(h)
+            T = thrust * math.cos(a)
+            D = density * (v ** 2) * effective_area * 0.5
+            Fg = m * g * math.sin(gamma)
+
+            # like advance_state the stage thrust also acts perpendicular while coasting
+            c = -g + (v ** 2) / (earth_radius + h)
+            gamma_dot = (math.cos(gamma) * c + stage.thrust * math.sin(a) / m) / v if v > 0 else 0
+
+            return [(T - D - Fg) / m,
+                    v * math.sin(gamma),
+                    gamma_dot,
+                    v * math.cos(gamma) / (earth_radius + h),
+                    -mass_flux,
+                    Fg / m,
+                    D / m,
+                    T / m]
+
+        return f
+
+    def _store(self, state, t, y, a, description):
+        """Copies the state vector into the State object."""
+        state.t = t
+        state.v = y[V]
+        state.h = y[H]
+        state.gamma = y[GAMMA]
+        state.local_horizon = y[LOCAL_HORIZON]
+        state.m = y[M]
+        state.a = a
+        density, _ = self.environment(state.h)
+        state.temp = Physics.max_temperature(state.v, state.h, effective_nose_radius, density=density)
+        state.orbit.update(state.h, state.v, state.gamma)
+        state.description = description
+
+    def _turn_angle(self, h):
+        if self.gravity_turn.start < h < self.gravity_turn.end:
+            return math.radians(self.gravity_turn.angle)
+        return 0
+
+    @staticmethod
+    def _coast_time_limit(y):
+        """Upper bound of the coast to apoapsis, the drag only shortens the coast along the Kepler orbit."""
+        orbit = Orbit(y[H], y[V], y[GAMMA])
+        if not orbit.eccentricity < 1:
+            # no apoapsis ahead
+            return 0
+        return orbit.time_to_apoapsis() + COAST_TIME_MARGIN
+
+    # event functions, an event occurs where the function changes its sign. The events that end an
+    # integration are negative before and positive once they occurred.
+
+    def _turn_start(self, y, f):
+        return y[H] - self.gravity_turn.start
+
+    def _turn_end(self, y, f):
+        return y[H] - self.gravity_turn.end
+
+    def _apoapsis_at_target(self, y, f):
+        return Orbit(y[H], y[V], y[GAMMA]).apoapsis_height - self.target_orbit
+
+    def _periapsis_at_target(self, y, f):
+        # the eccentricity is at its minimum once the apoapsis is above the target
+        return min(self._apoapsis_at_target(y, f), self._eccentricity_minimum(y, f))
+
+    @staticmethod
+    def _apoapsis(y, f):
+        # sign of the descent rate
+        return -math.sin(y[GAMMA])
 
-            if simulation_states[-2].orbit.eccentricity < state.orbit.eccentricity:
-                break
\ No newline at end of file
+    @staticmethod
+    def _eccentricity_minimum(y, f):
+        """Has the sign of the rate of change of the eccentricity, which turns positive after its minimum."""
+        v, h, gamma = y[V], y[H], y[GAMMA]
+        dy = f(y)
+        orbit = Orbit(h, v, gamma)
+        distance_dot = dy[H]
+        energy_dot = v * dy[V] + orbit.mu / orbit.distance ** 2 * distance_dot
+        angular_momentum_dot = (distance_dot * v * math.cos(gamma) + orbit.distance * dy[V] * math.cos(gamma)
+                                - orbit.distance * v * math.sin(gamma) * dy[GAMMA])
+        return (energy_dot * orbit.angular_momentum ** 2
+                + 2 * orbit.energy * orbit.angular_momentum * angular_momentum_dot)
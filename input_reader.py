@@ -1,49 +1,145 @@
-from rocket_flight_sim.stage import Stage
+import csv
+import os
+import re
+
+import numpy as np
+
+from stage import Stage
+
+# stage values of the staging output, numbered by stage as in m_dry_1
+STAGE_KEYS = ('m_dry', 'm_propellant', 'c', 'massflow')
+KEY_NAMES = {'m_dry': 'm_dry', 'm_propellant': 'm_propellant', 'c': 'c', 'massflow': 'MassFlow'}
+_STAGE_LINE = re.compile(r'^\s*(m_dry|m_propellant|c|massflow)_(\d+)\s*:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+_PAYLOAD_LINE = re.compile(r'^\s*payload\s*:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+_STAGE_COLUMN = re.compile(r'(m_dry|m_propellant|c|massflow)_(\d+)$', re.IGNORECASE)
 
 
 def read_staging_output(filename):
+    """Reads the stages of a staging output file, one per numbered set of m_dry, m_propellant, c and MassFlow.
+
+    Masses are given in kg and converted to tons, the payload is carried by the last stage.
+    """
     with open(filename, 'r') as f:
-        # Parse line by line, stripping units and converting kg to tons
-        lines = f.readlines()
-    stage1_dry = None
-    stage2_dry = None
-    stage1_prop = None
-    stage2_prop = None
-    c_1 = None
-    c_2 = None
-    MassFlow_1 = None
-    MassFlow_2 = None
-    engine_weight = None
-    payload = None
-    for line in lines:
-        line = line.strip()
-        if not line or ':' not in line:
-            continue
-        key, val = line.split(':', 1)
-        val = val.strip()
-        # Remove units (e.g. 'kg', 'm/s', 'kg/s')
-        val_num = val.split()[0]
-        if key.lower().startswith("m_dry_1"):
-            stage1_dry = float(val_num) / 1000
-        elif key.lower().startswith("m_dry_2"):
-            stage2_dry = float(val_num) / 1000
-        elif key.lower().startswith("m_propellant_1"):
-            stage1_prop = float(val_num) / 1000
-        elif key.lower().startswith("m_propellant_2"):
-            stage2_prop = float(val_num) / 1000
-        elif key.strip() == "c_1":
-            c_1 = float(val_num)
-        elif key.strip() == "c_2":
-            c_2 = float(val_num)
-        elif key.strip() == "MassFlow_1":
-            MassFlow_1 = float(val_num)
-        elif key.strip() == "MassFlow_2":
-            MassFlow_2 = float(val_num)
-        elif key.lower().startswith("engine weight"):
-            engine_weight = float(val_num) / 1000
-        elif key.lower().startswith("payload"):
-            payload = float(val_num) / 1000
-
-    stage1 = Stage(stage1_dry, stage1_prop, c_1, MassFlow_1, 0)
-    stage2 = Stage(stage2_dry, stage2_prop, c_2, MassFlow_2, payload)
-    return stage1, stage2
\ No newline at end of file
+        return tuple(parse_staging_output(f.read(), filename))
+
+
+def parse_staging_output(text, source='<text>'):
+    stage_values = {}
+    for key, number, value in _STAGE_LINE.findall(text):
+        # strip units, e.g. 'kg' or 'm/s' are separated by a space
+        stage_values.setdefault(int(number), {})[key.lower()] = float(value)
+    payloads = _PAYLOAD_LINE.findall(text)
+    if not payloads:
+        raise ValueError(f'{source}: missing Payload')
+    return make_stages(stage_values, float(payloads[-1]), source)
+
+
+def make_stages(stage_values, payload, source):
+    """Validates the values of every stage number and builds the stages."""
+    numbers = sorted(stage_values)
+    if numbers != list(range(1, len(numbers) + 1)):
+        raise ValueError(f'{source}: stages {numbers} are not numbered from 1 without gaps')
+
+    stages = []
+    for number in numbers:
+        values = stage_values[number]
+        missing = [f'{KEY_NAMES[key]}_{number}' for key in STAGE_KEYS if key not in values]
+        if missing:
+            raise ValueError(f'{source}: missing {", ".join(missing)}')
+        if values['m_dry'] < 0 or min(values['m_propellant'], values['c'], values['massflow']) <= 0:
+            raise ValueError(f'{source}: stage {number} needs a positive propellant mass, exhaust velocity '
+                             f'and mass flow')
+
+        stage_payload = payload / 1000 if number == numbers[-1] else 0
+        stages.append(Stage(values['m_dry'] / 1000, values['m_propellant'] / 1000, values['c'], values['massflow'],
+                            stage_payload))
+    return stages
+
+
+def read_staging_directory(directory, extension='.txt'):
+    """Reads every staging output file of a directory, returns a dict of the file names and their stages."""
+    configurations = {}
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if entry.is_file() and entry.name.endswith(extension):
+            with open(entry.path, 'r') as f:
+                configurations[entry.name] = parse_staging_output(f.read(), entry.path)
+    return configurations
+
+
+def read_staging_table(filename):
+    """Reads a table with one configuration per row from a csv or parquet file.
+
+    The columns are named like the keys of the staging output (m_dry_1, m_propellant_1, c_1, MassFlow_1,
+    ..., Payload) in kg and m/s. Stages missing in a row are left empty. An optional name column names
+    the configurations, otherwise they are named by row number. Returns a dict of the names and their stages.
+    Parquet files are read with pandas.
+    """
+    if filename.endswith('.parquet'):
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError('pandas is required to read parquet files') from None
+        frame = pandas.read_parquet(filename)
+        columns = {name: frame[name].to_numpy() for name in frame.columns}
+    else:
+        with open(filename, newline='') as f:
+            reader = csv.reader(f)
+            header = [name.strip() for name in next(reader)]
+            rows = list(reader)
+        columns = {name: [row[i].strip() if i < len(row) else '' for row in rows] for i, name in enumerate(header)}
+
+    lower = {name.lower(): name for name in columns}
+    if 'payload' not in lower:
+        raise ValueError(f'{filename}: missing Payload column')
+    names = [str(name) for name in columns[lower['name']]] if 'name' in lower else None
+
+    # one array per stage value, with nan for empty cells
+    stage_columns = {}
+    for name, values in columns.items():
+        match = _STAGE_COLUMN.match(name)
+        if match:
+            stage_columns.setdefault(int(match[2]), {})[match[1].lower()] = _float_column(values)
+    payload = _float_column(columns[lower['payload']])
+    count = len(payload)
+    if names is None:
+        names = [str(i) for i in range(count)]
+
+    stage_count = np.zeros(count, dtype=int)
+    for number in sorted(stage_columns):
+        values = stage_columns[number]
+        present = np.zeros(count, dtype=bool)
+        for key in STAGE_KEYS:
+            if key in values:
+                present |= ~np.isnan(values[key])
+        # the stages of a row must be numbered from 1 without gaps
+        gaps = present & (stage_count != number - 1)
+        if gaps.any():
+            raise ValueError(f'{filename}: stage {number} without stage {number - 1} in {names[gaps.argmax()]}')
+        stage_count[present] = number
+
+    invalid = np.isnan(payload) | (stage_count == 0)
+    if invalid.any():
+        raise ValueError(f'{filename}: configuration {names[invalid.argmax()]} has no stages or payload')
+
+    configurations = {}
+    for row, name in enumerate(names):
+        stage_values = {number: {key: column[row] for key, column in stage_columns[number].items()
+                                 if not np.isnan(column[row])}
+                        for number in range(1, stage_count[row] + 1)}
+        configurations[name] = make_stages(stage_values, payload[row], f'{filename}: {name}')
+    return configurations
+
+
+def read_configurations(path):
+    """Reads the stage configurations of a staging output file, a directory of them or a table."""
+    if os.path.isdir(path):
+        return read_staging_directory(path)
+    if path.endswith(('.csv', '.parquet')):
+        return read_staging_table(path)
+    return {os.path.basename(path): list(read_staging_output(path))}
+
+
+def _float_column(values):
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'fiu':
+        return values.astype(float)
+    return np.array([np.nan if value in ('', None) else value for value in values], dtype=float)
@@ -0,0 +1,141 @@
+import time
+
+
+class SimulationHooks:
+    """Callbacks of a running FlightSim, override the ones of interest.
+
+    All callbacks get the simulation and the current state, which is reused by the simulation.
+    """
+
+    def on_step(self, sim, state):
+        pass
+
+    def on_resume(self, sim, state, phase, stage_index):
+        """Start of a flight resumed from a checkpoint, after the event of phase in PHASES of flight_sim."""
+        pass
+
+    def on_stage_ignition(self, sim, state, stage_index):
+        pass
+
+    def on_burnout(self, sim, state, stage_index):
+        pass
+
+    def on_meco(self, sim, state):
+        """Main engine cutoff once the target apoapsis or periapsis is reached."""
+        pass
+
+    def on_circularization(self, sim, state):
+        """Start of the circularization burn at apoapsis."""
+        pass
+
+    def on_finish(self, sim, state):
+        pass
+
+
+class PhaseCounter:
+    """Counters of one flight phase."""
+
+    def __init__(self, name):
+        self.name = name
+        self.steps = 0
+        self.wall_time = 0
+        self.evaluations = 0
+        self.loss_gravity = 0
+        self.loss_drag = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class PhaseStats(SimulationHooks):
+    """Collects steps, wall time, force evaluations and losses for every flight phase.
+
+    The phases are the burn of every stage, the coast to apoapsis and the circularization burn.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._phase = None
+        self._start = None
+
+    def on_step(self, sim, state):
+        self._phase.steps += 1
+
+    def on_resume(self, sim, state, phase, stage_index):
+        # the phase that was running when the checkpoint was taken, the next ignition begins its own
+        names = {'ascent': f'Stage {stage_index + 1}', 'coast': 'Coast', 'circularization': 'Circularization'}
+        if phase in names:
+            self._begin(sim, names[phase])
+
+    def on_stage_ignition(self, sim, state, stage_index):
+        self._begin(sim, f'Stage {stage_index + 1}')
+
+    def on_meco(self, sim, state):
+        if sim.circ:
+            self._begin(sim, 'Coast')
+        else:
+            self._end(sim)
+
+    def on_circularization(self, sim, state):
+        self._begin(sim, 'Circularization')
+
+    def on_finish(self, sim, state):
+        self._end(sim)
+
+    def report(self):
+        lines = []
+        for phase in self.phases.values():
+            lines.append(f'{phase.name}: {phase.steps} steps, {phase.wall_time:.3f}s, '
+                         f'{phase.evaluations} force evaluations, gravity loss {phase.loss_gravity:.1f} m/s, '
+                         f'drag loss {phase.loss_drag:.1f} m/s')
+        return '\n'.join(lines)
+
+    def _begin(self, sim, name):
+        self._end(sim)
+        self._phase = self.phases[name] = PhaseCounter(name)
+        self._start = time.perf_counter(), sim.evaluations, sim.loss_gravity, sim.loss_drag
+
+    def _end(self, sim):
+        if self._start is None:
+            return
+        wall_time, evaluations, loss_gravity, loss_drag = self._start
+        self._phase.wall_time += time.perf_counter() - wall_time
+        self._phase.evaluations += sim.evaluations - evaluations
+        self._phase.loss_gravity += sim.loss_gravity - loss_gravity
+        self._phase.loss_drag += sim.loss_drag - loss_drag
+        self._start = None
+
+
+class CheckpointRecorder(SimulationHooks):
+    """Takes a checkpoint at every event, see FlightSim.checkpoint.
+
+    The checkpoints are stored by event, ('ignition', i) and ('burnout', i) for the stage events and
+    'meco' and 'circularization', e.g. to try several target orbits after the first stage:
+
+        recorder = CheckpointRecorder()
+        FlightSim(stages, gravity_turn, hooks=[recorder]).simulate()
+        for target_orbit in target_orbits:
+            sim = FlightSim(stages, gravity_turn, target_orbit, True)
+            sim.simulate(start=recorder.checkpoints['burnout', 0])
+
+    Simulations that do not take checkpoints, with another integrator or the kernels, record none.
+    """
+
+    def __init__(self):
+        self.checkpoints = {}
+
+    def on_stage_ignition(self, sim, state, stage_index):
+        self._record(sim, ('ignition', stage_index))
+
+    def on_burnout(self, sim, state, stage_index):
+        self._record(sim, ('burnout', stage_index))
+
+    def on_meco(self, sim, state):
+        self._record(sim, 'meco')
+
+    def on_circularization(self, sim, state):
+        self._record(sim, 'circularization')
+
+    def _record(self, sim, event):
+        if sim.resumable:
+            self.checkpoints[event] = sim.checkpoint()
@@ -0,0 +1,117 @@
+import math
+
+
+def _combine(y, dt, ks, coefficients):
+    """Returns y + dt * sum(c * k) for the given stage derivatives."""
+    return [y_i + dt * sum(c * k[i] for c, k in zip(coefficients, ks) if c) for i, y_i in enumerate(y)]
+
+
+class RK4:
+    """Classic fixed step Runge-Kutta integrator of fourth order."""
+
+    def __init__(self, time_step):
+        self.initial_step = time_step
+        self.evaluations = 0
+
+    def step(self, f, y, dt):
+        """Advances y by dt and returns the new state, the step taken and the next step size."""
+        return self.single(f, y, dt), dt, self.initial_step
+
+    def single(self, f, y, dt):
+        """Advances y by exactly dt."""
+        k1 = f(y)
+        k2 = f(_combine(y, dt, (k1,), (0.5,)))
+        k3 = f(_combine(y, dt, (k2,), (0.5,)))
+        k4 = f(_combine(y, dt, (k3,), (1,)))
+        self.evaluations += 4
+        return _combine(y, dt, (k1, k2, k3, k4), (1 / 6, 1 / 3, 1 / 3, 1 / 6))
+
+
+class RK45:
+    """Embedded Dormand-Prince 5(4) integrator with step size control."""
+
+    # Butcher tableau, the nodes are not needed as the flight equations do not depend on time
+    A = ((),
+         (1 / 5,),
+         (3 / 40, 9 / 40),
+         (44 / 45, -56 / 15, 32 / 9),
+         (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+         (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+         (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84))
+    # fifth order weights are the last row of A, E holds the difference to the fourth order weights
+    E = (71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+    def __init__(self, time_step, rtol=1e-8, atol=1e-6, max_step=math.inf, min_step=1e-9):
+        self.initial_step = time_step
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.min_step = min_step
+        self.evaluations = 0
+        self._fsal = None
+
+    def step(self, f, y, dt):
+        """Advances y by at most dt and returns the new state, the step taken and the next step size.
+
+        Steps are repeated with a smaller size until the estimated error is within the tolerances.
+        """
+        dt = min(dt, self.max_step)
+        while True:
+            y1, error = self._attempt(f, y, dt)
+            # scaled RMS norm of the error estimate
+            norm = math.sqrt(sum((e / (self.atol + self.rtol * max(abs(a), abs(b)))) ** 2
+                                 for e, a, b in zip(error, y, y1)) / len(y))
+            if norm <= 1 or dt <= self.min_step:
+                factor = 5 if norm == 0 else min(5, 0.9 * norm ** -0.2)
+                return y1, dt, min(dt * factor, self.max_step)
+            dt *= max(0.2, 0.9 * norm ** -0.2)
+
+    def single(self, f, y, dt):
+        """Advances y by exactly dt without error control."""
+        return self._attempt(f, y, dt)[0]
+
+    def _attempt(self, f, y, dt):
+        # first same as last, the last stage of an accepted step is the first of the next one
+        if self._fsal is not None and self._fsal[0] is f and self._fsal[1] is y:
+            ks = [self._fsal[2]]
+        else:
+            ks = [f(y)]
+            self.evaluations += 1
+
+        for a in self.A[1:]:
+            ks.append(f(_combine(y, dt, ks, a)))
+        self.evaluations += 6
+
+        y1 = _combine(y, dt, ks[:6], self.A[6])
+        self._fsal = f, y1, ks[6]
+        error = [dt * sum(e * k[i] for e, k in zip(self.E, ks) if e) for i in range(len(y))]
+        return y1, error
+
+
+def counting(integrator, f):
+    """Returns f adding its calls to the evaluations of the integrator, for event functions that call it."""
+    def counted(y):
+        integrator.evaluations += 1
+        return f(y)
+    return counted
+
+
+def find_event(integrator, f, y, dt, event, tolerance=1e-6):
+    """Finds the first time in (0, dt] at which the event function changes its sign.
+
+    Uses bisection on the step size and returns the step size and the state just after the sign
+    change, so that the event function at the returned state already has its new sign.
+    """
+    counted = counting(integrator, f)
+    g0 = event(y, counted)
+    lo, hi = 0, dt
+    y_hi = integrator.single(f, y, dt)
+    while hi - lo > tolerance:
+        mid = 0.5 * (lo + hi)
+        y_mid = integrator.single(f, y, mid)
+        g = event(y_mid, counted)
+        if (g > 0) == (g0 > 0) and g != 0:
+            lo = mid
+        else:
+            hi, y_hi = mid, y_mid
+    return hi, y_hi
@@ -0,0 +1,187 @@
+"""Compiled backend of the fixed step simulation, see FlightSim(backend='kernels').
+
+The state of the rocket is a flat vector and the forces are pure functions of plain numbers, so the
+loops over the steps of a flight phase compile with numba. Without numba the same functions run as
+plain python. Every operation is done in the same order as in FlightSim.advance_state, so the
+results are identical to those of the python backend.
+"""
+import math
+
+import numpy as np
+
+import physics
+from environment import ExponentialAtmosphere, InverseSquareGravity
+from orbit import mu
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# layout of the state vector, starting with the STATE_FIELDS of the trajectory module
+TIME, V, M, H, GAMMA, A, TEMP, LOCAL_HORIZON, LOSS_GRAVITY, LOSS_DRAG, DELTA_V = range(11)
+STATE_SIZE = 11
+
+# layout of the parameter vector
+DT, AREA, NOSE_RADIUS, SURFACE_DENSITY, DENSITY_EXPONENT, GRAVITY_MU, GRAVITY_RADIUS, TURN_START, TURN_END, \
+    TURN_ANGLE, TARGET_ORBIT = range(11)
+
+# conditions that shut off the engines before burnout
+NO_SHUTDOWN, APOAPSIS_AT_TARGET, PERIAPSIS_AT_TARGET, ECCENTRICITY_MINIMUM = range(4)
+
+# why a loop returned
+FINISHED, SHUTDOWN, BUFFER_FULL = range(3)
+
+earth_radius = physics.earth_radius
+
+
+def kernel(function):
+    """Compiles the function with numba if it is installed."""
+    if numba is None:
+        return function
+    return numba.njit(cache=True)(function)
+
+
+def parameters(sim, effective_area, effective_nose_radius):
+    """Packs the constants of a FlightSim into the parameter vector."""
+    if type(sim.atmosphere) is not ExponentialAtmosphere or type(sim.gravity) is not InverseSquareGravity:
+        raise ValueError('the kernels only support the exponential atmosphere and inverse square gravity')
+    p = [0.0] * 11
+    p[DT] = sim.time_step
+    p[AREA] = effective_area
+    p[NOSE_RADIUS] = effective_nose_radius
+    p[SURFACE_DENSITY] = sim.atmosphere.surface_density
+    p[DENSITY_EXPONENT] = -sim.atmosphere.decay
+    p[GRAVITY_MU] = sim.gravity.mu
+    p[GRAVITY_RADIUS] = sim.gravity.radius
+    p[TURN_START] = sim.gravity_turn.start
+    p[TURN_END] = sim.gravity_turn.end
+    p[TURN_ANGLE] = math.radians(sim.gravity_turn.angle)
+    p[TARGET_ORBIT] = sim.target_orbit
+    return _vector(p)
+
+
+def initial_state(loss_gravity=0.0, loss_drag=0.0, deltaV=0.0):
+    """State vector of the rocket on the launch pad, the losses continue from the given values."""
+    x = [0.0] * STATE_SIZE
+    x[GAMMA] = math.pi * 0.5
+    x[LOSS_GRAVITY] = loss_gravity
+    x[LOSS_DRAG] = loss_drag
+    x[DELTA_V] = deltaV
+    return _vector(x)
+
+
+def buffers(size):
+    """Arrays the loops record the state vectors and description codes of their steps in."""
+    return np.empty((size, STATE_SIZE)), np.empty(size, dtype=np.int8)
+
+
+def _vector(values):
+    # numba needs arrays, plain python is faster on lists
+    return np.array(values) if numba is not None else values
+
+
+@kernel
+def atmospheric_density(h, surface_density, exponent):
+    return surface_density * math.e ** (exponent * h)
+
+
+@kernel
+def gravitational_acceleration(h, gravity_mu, radius):
+    return gravity_mu / ((radius + h) ** 2.0)
+
+
+@kernel
+def max_temperature(v, density, nose_radius):
+    return (physics.k / (.8 * physics.sigma) * (v ** 3.0) * math.sqrt(density / nose_radius) + 293.0 ** 4.0) ** (1 / 4)
+
+
+@kernel
+def orbit_elements(h, v, gamma):
+    """Semi-major axis and eccentricity, computed like the Orbit class."""
+    distance = earth_radius + h
+    energy = 0.5 * v ** 2.0 - mu / distance
+    angular_momentum = distance * v * math.cos(gamma)
+    return -mu / (2 * energy), (1 + 2 * energy * angular_momentum ** 2.0 / (mu ** 2.0)) ** 0.5
+
+
+@kernel
+def euler_step(x, thrust, stage_thrust, p):
+    """Advances the state vector by one time step, thrust is zero while coasting."""
+    dt = p[DT]
+    v, m, h, gamma, a = x[V], x[M], x[H], x[GAMMA], x[A]
+
+    # acceleration in the direction of flight
+    density = atmospheric_density(h, p[SURFACE_DENSITY], p[DENSITY_EXPONENT])
+    g = gravitational_acceleration(h, p[GRAVITY_MU], p[GRAVITY_RADIUS])
+    T = thrust * math.cos(a)
+    D = density * (v ** 2.0) * p[AREA] * 0.5
+    Fg = m * g * math.sin(gamma)
+    x[LOSS_DRAG] += D / m * dt
+    x[LOSS_GRAVITY] += Fg / m * dt
+    x[DELTA_V] += T / m * dt
+    v += (T - D - Fg) / m * dt
+    h += v * math.cos(math.pi / 2 - gamma) * dt
+
+    # angular velocity, the stage thrust also acts perpendicular while coasting
+    density = atmospheric_density(h, p[SURFACE_DENSITY], p[DENSITY_EXPONENT])
+    g = gravitational_acceleration(h, p[GRAVITY_MU], p[GRAVITY_RADIUS])
+    T = stage_thrust * math.sin(a)
+    c = (-g + (v ** 2.0) / (earth_radius + h))
+    gamma += (math.cos(gamma) * c + T / m) / v * dt
+
+    x[V], x[H], x[GAMMA] = v, h, gamma
+    x[TEMP] = max_temperature(v, density, p[NOSE_RADIUS])
+    x[TIME] += dt
+    x[A] = p[TURN_ANGLE] if p[TURN_START] < h < p[TURN_END] else 0.0
+    x[LOCAL_HORIZON] += math.atan(v * dt * math.cos(gamma) / (earth_radius + h))
+
+
+@kernel
+def burn(x, rows, codes, count, stage_time, burn_time, thrust, upper_mass, start_mass, mass_flux, shutdown, code, p):
+    """Burns a stage until burnout, the shutdown condition or a full buffer.
+
+    Returns the number of recorded rows, the stage time, the height before the last step and why
+    the loop returned. After a full buffer the loop continues when called again with the stage time.
+    """
+    previous_h = x[H]
+    while stage_time < burn_time:
+        if count == len(rows):
+            return count, stage_time, previous_h, BUFFER_FULL
+        previous_h = x[H]
+        previous_eccentricity = orbit_elements(x[H], x[V], x[GAMMA])[1] if shutdown != NO_SHUTDOWN else 0.0
+
+        x[M] = upper_mass + (start_mass - mass_flux * stage_time)
+        euler_step(x, thrust, thrust, p)
+        rows[count, :] = x
+        codes[count] = code
+        count += 1
+        stage_time += p[DT]
+
+        if shutdown == NO_SHUTDOWN:
+            continue
+        semi_major_axis, eccentricity = orbit_elements(x[H], x[V], x[GAMMA])
+        if shutdown == ECCENTRICITY_MINIMUM:
+            if previous_eccentricity < eccentricity:
+                return count, stage_time, previous_h, SHUTDOWN
+        elif semi_major_axis * (1 + eccentricity) - earth_radius >= p[TARGET_ORBIT]:
+            if shutdown == APOAPSIS_AT_TARGET or previous_eccentricity < eccentricity:
+                return count, stage_time, previous_h, SHUTDOWN
+    return count, stage_time, previous_h, FINISHED
+
+
+@kernel
+def coast(x, rows, codes, count, previous_h, stage_thrust, code, p):
+    """Coasts while the rocket climbs, previous_h is the height before the last step.
+
+    Returns the number of recorded rows, the height before the last step and why the loop returned.
+    """
+    while x[H] > previous_h:
+        if count == len(rows):
+            return count, previous_h, BUFFER_FULL
+        previous_h = x[H]
+        euler_step(x, 0.0, stage_thrust, p)
+        rows[count, :] = x
+        codes[count] = code
+        count += 1
+    return count, previous_h, FINISHED
@@ -0,0 +1,113 @@
+"""Level of detail: downsampled trajectories whose size follows the screen instead of the step count.
+
+The flight time is split into buckets of equal duration. Every bucket keeps its first and last state
+and the states with the minimum and maximum of every column in it, so a line through the kept states
+covers the same pixels as the full one. Event points, the states around a change of the description
+or a kink of the mass (staging, engine cutoff and ignition), are always kept.
+
+The extremes of the finest buckets are found in one pass over the states, every coarser level merges
+pairs of buckets of the level below.
+"""
+import numpy as np
+
+from trajectory import Trajectory, STATE_FIELDS
+
+# change of the mass flow, relative to the largest mass, that marks staging, engine cutoff and ignition
+MASS_KINK = 1e-6
+
+
+def event_indices(mass, description_codes):
+    """Indices of the states around a change of the description and at the kinks of the mass."""
+    mass = np.asarray(mass, dtype=float)
+    changes = np.flatnonzero(np.diff(np.asarray(description_codes, dtype=int)))
+    if len(mass) < 3:
+        return np.unique(np.concatenate((changes, changes + 1)))
+    kinks = np.flatnonzero(np.abs(np.diff(mass, 2)) > MASS_KINK * np.abs(mass).max()) + 1
+    return np.unique(np.concatenate((changes, changes + 1, kinks)))
+
+
+class LevelOfDetail:
+    """Indices of the states kept at several resolutions of a series of columns over time.
+
+    The levels have buckets, buckets / 2, ... buckets / 2 ** (levels - 1) buckets, levels maps each
+    bucket count to the sorted indices kept at it. events are indices that every level keeps.
+    """
+
+    def __init__(self, time, columns, events=(), buckets=4096, levels=4):
+        if buckets % 2 ** (levels - 1):
+            raise ValueError(f'{buckets} buckets can not be halved {levels - 1} times')
+        time = np.asarray(time, dtype=float)
+        events = np.asarray(events, dtype=np.intp)
+        count = len(time)
+        self.levels = {}
+        if not count:
+            for level in range(levels):
+                self.levels[buckets >> level] = np.empty(0, dtype=np.intp)
+            return
+
+        edges = time[0] + (time[-1] - time[0]) * np.arange(1, buckets) / buckets
+        starts = np.concatenate(([0], np.searchsorted(time, edges)))
+        ends = np.append(starts[1:], count)
+        extremes = [_bucket_extremes(np.asarray(values, dtype=float), starts, ends) for values in columns.values()]
+
+        for level in range(levels):
+            nonempty = starts < ends
+            kept = [starts[nonempty], ends[nonempty] - 1, events]
+            for min_index, _, max_index, _ in extremes:
+                kept += [min_index[min_index >= 0], max_index[max_index >= 0]]
+            self.levels[len(starts)] = np.unique(np.concatenate(kept))
+
+            starts, ends = starts[::2], ends[1::2]
+            extremes = [_merge_pairs(*extreme) for extreme in extremes]
+
+    def indices(self, buckets):
+        """Indices kept by the coarsest level with at least the given number of buckets, or by the finest."""
+        for count in sorted(self.levels):
+            if count >= buckets:
+                return self.levels[count]
+        return self.levels[max(self.levels)]
+
+
+def trajectory_levels(trajectory, buckets=4096, levels=4):
+    """LevelOfDetail over all state fields of a trajectory, keeping its events."""
+    columns = {name: getattr(trajectory, name) for name in STATE_FIELDS}
+    events = event_indices(trajectory.m, trajectory.description_codes)
+    return LevelOfDetail(trajectory.t, columns, events, buckets, levels)
+
+
+def decimate(trajectory, buckets):
+    """Copy of the trajectory with only the states kept at the given number of buckets."""
+    indices = trajectory_levels(trajectory, buckets, 1).indices(buckets)
+    columns = {name: getattr(trajectory, name)[indices] for name in STATE_FIELDS}
+    return Trajectory.from_columns(columns, trajectory.description_codes[indices])
+
+
+def _bucket_extremes(values, starts, ends):
+    """Index and value of the minimum and maximum in every bucket, index -1 for empty buckets."""
+    buckets = len(starts)
+    min_index = np.full(buckets, -1, dtype=np.intp)
+    max_index = np.full(buckets, -1, dtype=np.intp)
+    min_value = np.full(buckets, np.inf)
+    max_value = np.full(buckets, -np.inf)
+
+    # the buckets cover all states, so the non-empty ones are consecutive segments starting at 0
+    nonempty = np.flatnonzero(starts < ends)
+    sizes = ends[nonempty] - starts[nonempty]
+    bucket = np.repeat(nonempty, sizes)
+    for index, value, reduce in ((min_index, min_value, np.fmin), (max_index, max_value, np.fmax)):
+        # nan values are skipped, buckets of only nan values stay empty
+        extreme = reduce.reduceat(values, starts[nonempty])
+        hits = np.flatnonzero(values == np.repeat(extreme, sizes))
+        first = hits[np.unique(bucket[hits], return_index=True)[1]]
+        index[bucket[first]] = first
+        value[bucket[first]] = values[first]
+    return min_index, min_value, max_index, max_value
+
+
+def _merge_pairs(min_index, min_value, max_index, max_value):
+    """Extremes of the buckets merged in pairs."""
+    rows = np.arange(len(min_index) // 2)
+    lower = np.argmin(min_value.reshape(-1, 2), axis=1)
+    upper = np.argmax(max_value.reshape(-1, 2), axis=1)
+    return (min_index.reshape(-1, 2)[rows, lower], min_value.reshape(-1, 2)[rows, lower],
+            max_index.reshape(-1, 2)[rows, upper], max_value.reshape(-1, 2)[rows, upper])
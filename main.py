@@ -1,25 +1,208 @@
+"""Command line entry point of the flight simulator.
+
+    python main.py simulate                      task 1 - no optimisation
+    python main.py simulate --optimize-staging --seed 1
+                                                 task 2 - optimised staging and circularisation
+    python main.py sweep --turn-angle 2 3 4 --target-orbit 300000 400000
+    python main.py sweep --input configurations.csv
+    python main.py target --apoapsis 400000 --periapsis 390000 --vary turn_angle target_orbit
+    python main.py plot
+    python main.py export trajectory.gif
+
+matplotlib is only imported by the plot and export commands.
+"""
+import argparse
+import itertools
+import sys
+
 import flight_sim
 from flight_sim import FlightSim
-from plotter import Plotter
-from rocket_flight_sim.input_reader import read_staging_output
+import input_reader
+from input_reader import read_staging_output
+
+
+def read_stages(args):
+    stages = list(read_staging_output(args.input))
+    if args.optimize_staging:
+        stages = optimize_staging(stages, args)
+    return stages
+
+
+def optimize_staging(stages, args):
+    """Searches the split of the stage masses that leaves the most fuel with the given gravity turn and target orbit,
+    see the optimizer module."""
+    from optimizer import AscentOptimizer
+
+    fixed = {'turn_start': args.turn_start, 'turn_end': args.turn_end, 'turn_angle': args.turn_angle,
+             'target_orbit': args.target_orbit}
+    optimizer = AscentOptimizer(stages, {name: (value, value) for name, value in fixed.items()}, seed=args.seed,
+                                checkpoint=args.optimizer_checkpoint, circularize=not args.no_circularize)
+    best = optimizer.optimize(args.generations)
+    if not args.quiet:
+        masses = ', '.join(f'{stage.structure_mass + stage.propellant_mass:.3f} t' for stage in best.stages)
+        print(f'Optimised stage masses: {masses} - score {best.score:.1f}')
+    return best.stages
+
+
+def create_sim(args):
+    gravity_turn = flight_sim.GravityTurn(args.turn_start, args.turn_end, args.turn_angle)
+    return FlightSim(read_stages(args), gravity_turn, args.target_orbit, not args.no_circularize,
+                     time_step=args.time_step, integrator=args.integrator, verbose=not args.quiet,
+                     backend=args.backend, kepler_coast=args.kepler_coast, coast_output_interval=args.coast_interval)
+
+
+def run_simulation(args):
+    """Runs the configured flight and returns the trajectory, through the result cache if one is given."""
+    if getattr(args, 'trajectory', None):
+        if args.trajectory.endswith('.traj'):
+            from trajectory_file import load_trajectory
+            return load_trajectory(args.trajectory)
+        from sinks import read_binary_records
+        return read_binary_records(args.trajectory)
+
+    sim = create_sim(args)
+    if args.cache:
+        from cache import SimulationCache
+        return SimulationCache(args.cache).simulate(sim)
+    return sim.simulate()
+
+
+def simulate(args):
+    if args.output:
+        from sinks import BinarySink, CsvSink
+        from trajectory_file import TrajectoryFileSink
+        sim = create_sim(args)
+        if args.output.endswith('.csv'):
+            sink = CsvSink(args.output)
+        elif args.output.endswith('.traj'):
+            sink = TrajectoryFileSink(args.output, sim, buckets=args.output_buckets)
+        else:
+            sink = BinarySink(args.output)
+        sim.simulate_to(sink, args.output_interval)
+        return
+
+    result = run_simulation(args)
+    orbit = result[-1].orbit
+    print(f'{len(result)} states, apoapsis {orbit.apoapsis_height / 1000:.1f} km, '
+          f'periapsis {orbit.periapsis_height / 1000:.1f} km')
+
+
+def sweep(args):
+    """Simulates every combination of the stage configurations, gravity turns and target orbits as one batch."""
+    from batch_sim import BatchFlightSim
+
+    configurations = input_reader.read_configurations(args.input)
+    combinations = list(itertools.product(configurations, args.turn_start, args.turn_end, args.turn_angle,
+                                          args.target_orbit))
+    sim = BatchFlightSim([configurations[name] for name, *_ in combinations],
+                         [flight_sim.GravityTurn(start, end, angle) for _, start, end, angle, _ in combinations],
+                         [target for *_, target in combinations], not args.no_circularize, args.time_step)
+    result = sim.simulate()
+
+    print('configuration, turn start [m], turn end [m], turn angle [deg], target orbit [m], apoapsis [km], '
+          'periapsis [km], fuel left [kg]')
+    for i, (name, start, end, angle, target) in enumerate(combinations):
+        print(f'{name}, {start:g}, {end:g}, {angle:g}, {target:g}, {result.apoapsis_height[i] / 1000:.1f}, '
+              f'{result.periapsis_height[i] / 1000:.1f}, {result.fuel_left[i]:.1f}')
+
+
+def target(args):
+    """Moves the varied parameters until the final orbit hits the targets, see the targeting module."""
+    from targeting import Targeting
+
+    targets = {name: value for name, value in (('apoapsis_height', args.apoapsis), ('periapsis_height', args.periapsis),
+                                               ('fuel_left', args.fuel_left)) if value is not None}
+    if not targets:
+        raise SystemExit('target needs --apoapsis, --periapsis or --fuel-left')
+    gravity_turn = flight_sim.GravityTurn(args.turn_start, args.turn_end, args.turn_angle)
+    targeting = Targeting(read_stages(args), gravity_turn, args.target_orbit, not args.no_circularize, args.time_step,
+                          args.integrator, parameters=args.vary)
+    print(targeting.solve(targets, max_iterations=args.iterations).report())
+
+
+def plot(args):
+    from plotter import Plotter
+    Plotter(run_simulation(args)).plot()
+
+
+def export(args):
+    from plotter import Plotter
+    Plotter(run_simulation(args)).export_gif(args.filename, args.frame_interval, args.fps, workers=args.workers)
+
+
+def add_flight_arguments(parser, sweep=False):
+    # a sweep takes several values of the flight parameters
+    nargs = '+' if sweep else None
+    default = (lambda value: [value]) if sweep else (lambda value: value)
+    if sweep:
+        parser.add_argument('--input', default='input.txt',
+                            help='staging file, directory of staging files or .csv/.parquet table of configurations')
+    else:
+        parser.add_argument('--input', default='input.txt', help='staging file')
+    parser.add_argument('--turn-start', type=float, nargs=nargs, default=default(1000), help='m')
+    parser.add_argument('--turn-end', type=float, nargs=nargs, default=default(3500), help='m')
+    parser.add_argument('--turn-angle', type=float, nargs=nargs, default=default(3), help='degrees')
+    parser.add_argument('--target-orbit', type=float, nargs=nargs, default=default(400000), help='m')
+    parser.add_argument('--no-circularize', action='store_true')
+    parser.add_argument('--time-step', type=float, default=0.01, help='s')
+    if not sweep:
+        parser.add_argument('--optimize-staging', action='store_true',
+                            help='first search the split of the stage masses that leaves the most fuel')
+        parser.add_argument('--generations', type=int, default=20, help='generations of the staging search')
+        parser.add_argument('--seed', type=int, help='random seed of the staging search')
+        parser.add_argument('--optimizer-checkpoint',
+                            help='file of the staging search state, an interrupted search continues from it')
+        parser.add_argument('--integrator', choices=('euler', 'rk4', 'rk45'), default='euler')
+        parser.add_argument('--backend', choices=('python', 'kernels'), default='python',
+                            help='kernels runs the euler steps compiled with numba if it is installed')
+        parser.add_argument('--kepler-coast', action='store_true', help='coast along the Kepler orbit above the air')
+        parser.add_argument('--coast-interval', type=float, help='s between the states of the Kepler coast')
+        parser.add_argument('--cache', help='directory of the result cache')
+        parser.add_argument('--quiet', action='store_true', help='no progress messages')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('simulate', help='run a flight')
+    add_flight_arguments(command)
+    command.add_argument('--output', help='write the states to a .csv, .traj trajectory file or binary records')
+    command.add_argument('--output-interval', type=float, help='s between written states')
+    command.add_argument('--output-buckets', type=int,
+                         help='only write the extremes and events of that many time buckets to a .traj file')
+    command.set_defaults(function=simulate)
 
-stage1, stage2 = read_staging_output('input.txt')
-stages = [stage1, stage2]
+    command = commands.add_parser('sweep', help='run a grid of gravity turns and target orbits')
+    add_flight_arguments(command, sweep=True)
+    command.set_defaults(function=sweep)
 
-# task 1 - no optimisation
-gravity_turn = flight_sim.GravityTurn(1000, 3500, 3)
-sim = FlightSim(stages, gravity_turn, 400000, True, time_step=0.01)
-result = sim.simulate()
+    command = commands.add_parser('target', help='find the parameters of a flight that hits a target orbit')
+    add_flight_arguments(command)
+    command.add_argument('--apoapsis', type=float, help='m')
+    command.add_argument('--periapsis', type=float, help='m')
+    command.add_argument('--fuel-left', type=float, help='kg')
+    command.add_argument('--vary', nargs='+', default=['turn_angle', 'target_orbit'],
+                         help='turn_start, turn_end, turn_angle, target_orbit, structure_mass_i or propellant_mass_i')
+    command.add_argument('--iterations', type=int, default=10)
+    # the located events of rk45 make the final orbit smooth in the parameters
+    command.set_defaults(function=target, integrator='rk45', time_step=0.1)
 
-plotter = Plotter(result)
-plotter.plot()
-plotter.export_gif()
+    for name, function in (('plot', plot), ('export', export)):
+        command = commands.add_parser(name, help=f'{name} a flight')
+        add_flight_arguments(command)
+        command.add_argument('--trajectory',
+                             help='.traj or binary file written by simulate --output instead of a new run')
+        command.set_defaults(function=function)
+    command.add_argument('filename', nargs='?', default='trajectory.gif')
+    command.add_argument('--frame-interval', type=float, default=20, help='s of flight between frames')
+    command.add_argument('--fps', type=float, default=10)
+    command.add_argument('--workers', type=int, help='rendering processes')
 
-# task 2 - optimised staging and circularisation
-#stages = optimize_staging_two_stages(stages, 1/11, 10, 1000)
+    args = parser.parse_args(argv)
+    args.function(args)
+    return 0
 
-#gravity_turn = flight_sim.GravityTurn(1000, 9250, 8.4)
-#sim = FlightSim(stages, gravity_turn, 270000, True, time_step=0.01)
-#result = sim.simulate()
 
-#Plotter(result).plot()
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""Monte Carlo dispersion analysis of a launch.
+
+Every sample draws the dispersed parameters from their declared distributions, e.g.
+
+    dispersions = {'specific_impulse': Normal(1, 0.01), 'dry_mass': Uniform(0.98, 1.05), 'turn_angle': Normal(0, 0.2)}
+    result = MonteCarlo(stages, GravityTurn(1000, 3500, 3), 400000, True, dispersions=dispersions, seed=1).run(10000)
+    print(result.report())
+
+The samples are simulated in chunks, as lanes of a BatchFlightSim, over a process pool. Every chunk
+gets its own seed spawned from the seed of the run, so the results do not depend on the number of
+workers. Only the running statistics of the final orbits are kept, never the samples themselves.
+"""
+import bisect
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import flight_sim
+from batch_sim import BatchFlightSim
+from environment import ExponentialAtmosphere, ScaledAtmosphere
+from flight_sim import GravityTurn
+
+# dispersed parameters: factors of the stage values (drawn per stage), of the effective area and of the
+# air density, and an offset of the gravity turn angle in degrees
+STAGE_PARAMETERS = ('specific_impulse', 'mass_flux', 'dry_mass')
+PARAMETERS = STAGE_PARAMETERS + ('effective_area', 'density', 'turn_angle')
+
+# final values of every sample that are aggregated
+METRICS = ('apoapsis_height', 'periapsis_height', 'fuel_left')
+
+
+class Normal:
+    def __init__(self, mean, std):
+        self.mean = mean
+        self.std = std
+
+    def sample(self, rng, size):
+        return rng.normal(self.mean, self.std, size)
+
+
+class Uniform:
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        return rng.uniform(self.low, self.high, size)
+
+
+class P2Quantile:
+    """Streaming estimate of a quantile with the P-square algorithm of Jain and Chlamtac.
+
+    Five markers are kept instead of the values, their heights approximate the minimum, the
+    quantile and the maximum and two quantiles in between.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self.heights
+        if len(q) < 5:
+            bisect.insort(q, x)
+            return
+
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # move the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                        (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                        + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    # linear prediction if the parabola leaves the neighbouring markers
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    @property
+    def value(self):
+        if len(self.heights) < 5:
+            return self.heights[round(self.p * (len(self.heights) - 1))] if self.heights else math.nan
+        return self.heights[2]
+
+
+class RunningStatistics:
+    """Count, mean, variance, extremes and percentiles of a stream of values, in constant memory.
+
+    Non-finite values, e.g. the orbit of a rocket falling back, are only counted as invalid.
+    """
+
+    def __init__(self, percentiles=(5, 50, 95)):
+        self.count = 0
+        self.invalid = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.quantiles = {p: P2Quantile(p / 100) for p in percentiles}
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        finite = values[np.isfinite(values)]
+        self.invalid += len(values) - len(finite)
+        if not len(finite):
+            return
+
+        # combine the moments of the chunk with the ones so far (Chan et al.)
+        count = self.count + len(finite)
+        delta = finite.mean() - self.mean
+        self._m2 += ((finite - finite.mean()) ** 2).sum() + delta ** 2 * self.count * len(finite) / count
+        self.mean += delta * len(finite) / count
+        self.count = count
+        self.min = min(self.min, finite.min())
+        self.max = max(self.max, finite.max())
+        for quantile in self.quantiles.values():
+            for x in finite.tolist():
+                quantile.add(x)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def percentile(self, p):
+        return self.quantiles[p].value
+
+
+class MonteCarloResult:
+    def __init__(self, samples, successes, statistics):
+        self.samples = samples
+        self.successes = successes
+        self.statistics = statistics
+
+    @property
+    def success_rate(self):
+        return self.successes / self.samples if self.samples else math.nan
+
+    def report(self):
+        lines = [f'{self.successes} of {self.samples} samples in orbit ({self.success_rate:.1%})']
+        for name, statistics in self.statistics.items():
+            percentiles = ', '.join(f'p{p} {quantile.value:.1f}' for p, quantile in statistics.quantiles.items())
+            lines.append(f'{name}: mean {statistics.mean:.1f}, std {statistics.std:.1f}, min {statistics.min:.1f}, '
+                         f'max {statistics.max:.1f}, {percentiles} ({statistics.invalid} invalid)')
+        return '\n'.join(lines)
+
+
+class MonteCarlo:
+    """Runs a launch many times with dispersed parameters and aggregates the final orbits.
+
+    dispersions maps names of PARAMETERS to distributions. A sample is a success if its periapsis
+    is at least min_periapsis high.
+    """
+
+    def __init__(self, stages, gravity_turn, target_orbit=0, circularize=False, time_step=0.02, dispersions=None,
+                 min_periapsis=150000, seed=None, workers=None, chunk_size=256, atmosphere=None, gravity=None,
+                 percentiles=(5, 50, 95)):
+        unknown = set(dispersions or {}) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(f'unknown dispersed parameters {sorted(unknown)}')
+
+        self.stages = stages
+        self.gravity_turn = gravity_turn
+        self.target_orbit = target_orbit
+        self.circ = circularize
+        self.time_step = time_step
+        self.dispersions = dict(dispersions or {})
+        self.min_periapsis = min_periapsis
+        self.seed = seed
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.atmosphere = atmosphere or ExponentialAtmosphere()
+        self.gravity = gravity
+        self.percentiles = percentiles
+
+    def run(self, samples):
+        sizes = [min(self.chunk_size, samples - start) for start in range(0, samples, self.chunk_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        jobs = [(self, seed, size) for seed, size in zip(seeds, sizes)]
+
+        statistics = {name: RunningStatistics(self.percentiles) for name in METRICS}
+        successes = 0
+        with ProcessPoolExecutor(self.workers) as executor:
+            # the chunks are aggregated in order, so the estimates are reproducible
+            for final in executor.map(_run_chunk, jobs):
+                for name in METRICS:
+                    statistics[name].add(final[name])
+                successes += int(np.count_nonzero(final['periapsis_height'] >= self.min_periapsis))
+        return MonteCarloResult(samples, successes, statistics)
+
+    def sample(self, rng, size):
+        """Draws the dispersed parameters of size samples, stage parameters with one column per stage."""
+        values = {}
+        for name in PARAMETERS:
+            if name in self.dispersions:
+                shape = (size, len(self.stages)) if name in STAGE_PARAMETERS else size
+                values[name] = self.dispersions[name].sample(rng, shape)
+        return values
+
+    def simulate_chunk(self, seed, size):
+        """Simulates size samples drawn with the seed, returns the final values of every METRICS entry."""
+        values = self.sample(np.random.default_rng(seed), size)
+        ones = np.ones((size, len(self.stages)))
+        isp = values.get('specific_impulse', ones)
+        mass_flux = values.get('mass_flux', ones)
+        dry_mass = values.get('dry_mass', ones)
+
+        lane_stages = [[type(stage)(stage.structure_mass * dry_mass[lane, i], stage.propellant_mass,
+                                    stage.specific_impulse * isp[lane, i],
+                                    stage.propellant_mass_flux * mass_flux[lane, i], stage.payload_mass)
+                        for i, stage in enumerate(self.stages)]
+                       for lane in range(size)]
+        turn = self.gravity_turn
+        gravity_turns = [GravityTurn(turn.start, turn.end, turn.angle + offset)
+                         for offset in values.get('turn_angle', np.zeros(size))]
+
+        sim = BatchFlightSim(lane_stages, gravity_turns, self.target_orbit, self.circ, self.time_step,
+                             atmosphere=ScaledAtmosphere(self.atmosphere, values.get('density', np.ones(size))),
+                             gravity=self.gravity,
+                             effective_area=flight_sim.effective_area * values.get('effective_area', np.ones(size)))
+        result = sim.simulate()
+        return {name: getattr(result, name) for name in METRICS}
+
+
+def _run_chunk(job):
+    monte_carlo, seed, size = job
+    return monte_carlo.simulate_chunk(seed, size)
@@ -0,0 +1,180 @@
+import os
+import pickle
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from flight_sim import FlightSim, GravityTurn
+from trajectory import Trajectory
+
+# default search ranges of the ascent parameters
+DEFAULT_BOUNDS = {
+    'turn_start': (500, 2000),  # m
+    'turn_end': (2000, 15000),  # m
+    'turn_angle': (1, 12),  # degrees
+    'target_orbit': (200000, 450000),  # m
+}
+
+
+class Candidate:
+    """Ascent parameters of one evaluated candidate."""
+
+    def __init__(self, stages, gravity_turn, target_orbit, score):
+        self.stages = stages
+        self.gravity_turn = gravity_turn
+        self.target_orbit = target_orbit
+        self.score = score
+
+
+def fuel_left_in_orbit(sim, result, min_periapsis=150000):
+    """Scores a flight by the fuel left, runs that do not reach orbit are penalized by the missing periapsis height."""
+    fuel_left = result.m[-1] - sim.vehicle.final_dry_mass
+    periapsis_height = result.periapsis_height[-1]
+    if periapsis_height < min_periapsis:
+        return float(fuel_left - (min_periapsis - periapsis_height))
+    return float(fuel_left)
+
+
+def split_stages(stages, shares):
+    """Returns new stages with the total stage mass distributed by the given shares.
+
+    There is one share per stage except the last one, which gets the remainder. Every stage keeps
+    its ratio of structure to propellant mass, engine and the payload. The given stages are not changed.
+    """
+    total_mass = sum(stage.structure_mass + stage.propellant_mass for stage in stages)
+    shares = list(shares) + [1 - sum(shares)]
+
+    new_stages = []
+    for stage, share in zip(stages, shares):
+        structure_index = stage.structure_mass / (stage.structure_mass + stage.propellant_mass)
+        stage_mass = total_mass * share
+        new_stages.append(type(stage)(stage_mass * structure_index, stage_mass * (1 - structure_index),
+                                      stage.specific_impulse, stage.propellant_mass_flux, stage.payload_mass))
+    return new_stages
+
+
+class AscentOptimizer:
+    """Searches the stage mass split, the gravity turn and the target orbit jointly.
+
+    Every candidate is scored by a complete FlightSim run. The search is a differential evolution
+    whose generations are evaluated in parallel over a process pool. The random state and the
+    population are written to the checkpoint file after every generation, so an interrupted run
+    continues where it stopped when started again with the same checkpoint. A flight that takes
+    more than max_steps steps is stopped and scores -inf.
+    """
+
+    def __init__(self, stages, bounds=None, objective=fuel_left_in_orbit, population_size=24, seed=None,
+                 workers=None, checkpoint=None, circularize=True, integrator='euler', time_step=0.1,
+                 max_steps=100000):
+        self.stages = stages
+        self.bounds = dict(DEFAULT_BOUNDS)
+        for i in range(len(stages) - 1):
+            self.bounds[f'stage_share_{i}'] = (0.5 / (len(stages) - 1), 0.95)
+        self.bounds.update(bounds or {})
+        self.names = sorted(self.bounds)
+
+        self.objective = objective
+        self.population_size = population_size
+        self.workers = workers or os.cpu_count()
+        self.checkpoint = checkpoint
+        self.circ = circularize
+        self.integrator = integrator
+        self.time_step = time_step
+        self.max_steps = max_steps
+
+        self.random = random.Random(seed)
+        self.generation = 0
+        self.population = None
+        self.scores = None
+        if checkpoint and os.path.exists(checkpoint):
+            self._load_checkpoint()
+
+    def optimize(self, generations=20, mutation=0.7, crossover=0.8):
+        """Runs the given number of generations and returns the best Candidate."""
+        with ProcessPoolExecutor(self.workers) as executor:
+            if self.population is None:
+                self.population = [self._random_parameters() for _ in range(self.population_size)]
+                self.scores = list(executor.map(_evaluate, self._jobs(self.population)))
+                self._save_checkpoint()
+
+            while self.generation < generations:
+                trials = [self._trial(i, mutation, crossover) for i in range(len(self.population))]
+                for i, (trial, score) in enumerate(zip(trials, executor.map(_evaluate, self._jobs(trials)))):
+                    if score >= self.scores[i]:
+                        self.population[i] = trial
+                        self.scores[i] = score
+                self.generation += 1
+                self._save_checkpoint()
+
+        best = max(range(len(self.population)), key=lambda i: self.scores[i])
+        stages, gravity_turn, target_orbit = self.configuration(self.population[best])
+        return Candidate(stages, gravity_turn, target_orbit, self.scores[best])
+
+    def configuration(self, parameters):
+        """Returns the stages, gravity turn and target orbit for a parameter vector."""
+        values = dict(zip(self.names, parameters))
+        shares = [values[f'stage_share_{i}'] for i in range(len(self.stages) - 1)]
+        gravity_turn = GravityTurn(values['turn_start'], values['turn_end'], values['turn_angle'])
+        return split_stages(self.stages, shares), gravity_turn, values['target_orbit']
+
+    def _jobs(self, population):
+        for parameters in population:
+            stages, gravity_turn, target_orbit = self.configuration(parameters)
+            yield (stages, gravity_turn, target_orbit, self.circ, self.integrator, self.time_step, self.max_steps,
+                   self.objective)
+
+    def _random_parameters(self):
+        return [self.random.uniform(*self.bounds[name]) for name in self.names]
+
+    def _trial(self, i, mutation, crossover):
+        """Builds a trial vector from three other members of the population (DE/rand/1/bin)."""
+        a, b, c = self.random.sample([j for j in range(len(self.population)) if j != i], 3)
+        forced = self.random.randrange(len(self.names))
+        trial = []
+        for k, name in enumerate(self.names):
+            if k == forced or self.random.random() < crossover:
+                value = self.population[a][k] + mutation * (self.population[b][k] - self.population[c][k])
+                low, high = self.bounds[name]
+                trial.append(min(max(value, low), high))
+            else:
+                trial.append(self.population[i][k])
+        return trial
+
+    def _save_checkpoint(self):
+        if not self.checkpoint:
+            return
+        data = {'names': self.names, 'generation': self.generation, 'population': self.population,
+                'scores': self.scores, 'random': self.random.getstate()}
+        with open(self.checkpoint + '.tmp', 'wb') as f:
+            pickle.dump(data, f)
+        os.replace(self.checkpoint + '.tmp', self.checkpoint)
+
+    def _load_checkpoint(self):
+        with open(self.checkpoint, 'rb') as f:
+            data = pickle.load(f)
+        if data['names'] != self.names:
+            raise ValueError(f'checkpoint {self.checkpoint} was written for other parameters')
+        self.generation = data['generation']
+        self.population = data['population']
+        self.scores = data['scores']
+        self.random.setstate(data['random'])
+
+
+def _evaluate(job):
+    """Runs one flight in a worker process and returns its score."""
+    stages, gravity_turn, target_orbit, circularize, integrator, time_step, max_steps, objective = job
+    if any(stage.propellant_mass <= 0 for stage in stages):
+        return float('-inf')
+
+    # the progress messages of thousands of runs are not of interest
+    sim = FlightSim(stages, gravity_turn, target_orbit, circularize, time_step=time_step, integrator=integrator,
+                    verbose=False)
+    result = Trajectory()
+    try:
+        for state in sim.simulate_iter():
+            if len(result) == max_steps:
+                return float('-inf')
+            result.append(state)
+    except (ArithmeticError, ValueError):
+        # e.g. a math domain error of a rocket falling back to earth
+        return float('-inf')
+    return objective(sim, result)
@@ -1,35 +1,144 @@
 import math
+
+import numpy as np
+
 import physics
 
+# standard gravitational parameter of the earth
+mu = physics.gravitational_constant * physics.earth_mass
+
 
 class Orbit:
-    distance = 0
-    mu = 0
-    energy = 0
-    semi_major_axis = 0
-    eccentricity = 0
-    angular_momentum = 0
-    periapsis = 0
-    periapsis_height = 0
-    apoapsis = 0
-    apoapsis_height = 0
+    """Orbit elements of the rocket, derived from its height, velocity and flight path angle.
+
+    update only stores the flight values, the elements are computed when they are read. The semi-major
+    axis and eccentricity are kept until the next update, as the other elements are derived from them.
+    """
+    __slots__ = ('height', 'velocity', 'gamma', '_semi_major_axis', '_eccentricity')
+    mu = mu
 
     def __init__(self, height, velocity, gamma):
+        self.update(height, velocity, gamma)
+
+    def update(self, height, velocity, gamma):
         self.height = height
         self.velocity = velocity
         self.gamma = gamma
-        self.update(height, velocity, gamma)
+        self._semi_major_axis = None
+        self._eccentricity = None
 
-    def update(self, height, velocity, gamma):
-        self.distance = physics.earth_radius + height
-        self.mu = physics.gravitational_constant * physics.earth_mass
-        self.energy = 0.5 * velocity ** 2 - self.mu / self.distance
-        self.semi_major_axis = -self.mu / (2 * self.energy)
-        self.angular_momentum = self.distance * velocity * math.cos(gamma)
-        self.eccentricity = (1 + 2 * self.energy * self.angular_momentum ** 2 / (self.mu ** 2)) ** 0.5
-
-        self.periapsis = self.semi_major_axis * (1 - self.eccentricity)
-        self.periapsis_height = self.periapsis - physics.earth_radius
-
-        self.apoapsis = self.semi_major_axis * (1 + self.eccentricity)
-        self.apoapsis_height = self.apoapsis - physics.earth_radius
+    @property
+    def distance(self):
+        return physics.earth_radius + self.height
+
+    @property
+    def energy(self):
+        return 0.5 * self.velocity ** 2 - self.mu / self.distance
+
+    @property
+    def angular_momentum(self):
+        return self.distance * self.velocity * math.cos(self.gamma)
+
+    @property
+    def semi_major_axis(self):
+        if self._semi_major_axis is None:
+            self._semi_major_axis = -self.mu / (2 * self.energy)
+        return self._semi_major_axis
+
+    @property
+    def eccentricity(self):
+        if self._eccentricity is None:
+            self._eccentricity = (1 + 2 * self.energy * self.angular_momentum ** 2 / (self.mu ** 2)) ** 0.5
+        return self._eccentricity
+
+    @property
+    def periapsis(self):
+        return self.semi_major_axis * (1 - self.eccentricity)
+
+    @property
+    def periapsis_height(self):
+        return self.periapsis - physics.earth_radius
+
+    @property
+    def apoapsis(self):
+        return self.semi_major_axis * (1 + self.eccentricity)
+
+    @property
+    def apoapsis_height(self):
+        return self.apoapsis - physics.earth_radius
+
+    @property
+    def true_anomaly(self):
+        """Angle from the periapsis in radians, positive while climbing."""
+        angular_momentum = abs(self.angular_momentum)
+        radial_velocity = self.velocity * math.sin(self.gamma)
+        return math.atan2(radial_velocity * angular_momentum / self.mu,
+                          angular_momentum ** 2 / (self.mu * self.distance) - 1)
+
+    def time_to_apoapsis(self):
+        """Seconds of coasting until the next apoapsis."""
+        return (math.pi - self._eccentric_anomaly()[1]) / self._mean_motion()
+
+    def propagate(self, time):
+        """Coasts along the orbit for time seconds, without drag.
+
+        Returns the height, velocity, flight path angle and the angle travelled around the earth, with
+        the sign the local horizon changes by.
+        """
+        e = self.eccentricity
+        anomaly, mean_anomaly = self._eccentric_anomaly()
+        mean_anomaly += self._mean_motion() * time
+
+        # solve Kepler's equation, starting from the old eccentric anomaly
+        for _ in range(50):
+            correction = (anomaly - e * math.sin(anomaly) - mean_anomaly) / (1 - e * math.cos(anomaly))
+            anomaly -= correction
+            if abs(correction) < 1e-12:
+                break
+
+        distance = self.semi_major_axis * (1 - e * math.cos(anomaly))
+        true_anomaly = _true_anomaly(anomaly, e)
+        radial_velocity = math.sqrt(self.mu / (self.semi_major_axis * (1 - e ** 2))) * e * math.sin(true_anomaly)
+        horizontal_velocity = math.copysign(abs(self.angular_momentum) / distance, math.cos(self.gamma))
+        travelled = true_anomaly - _true_anomaly(self._eccentric_anomaly()[0], e)
+        # the flight path angle continues from the current one instead of wrapping around
+        gamma = self.gamma + math.remainder(math.atan2(radial_velocity, horizontal_velocity) - self.gamma, 2 * math.pi)
+        return (distance - physics.earth_radius, math.hypot(radial_velocity, horizontal_velocity), gamma,
+                math.copysign(travelled, horizontal_velocity))
+
+    def _eccentric_anomaly(self):
+        # eccentric and mean anomaly of the current position
+        e = self.eccentricity
+        if not 0 <= e < 1:
+            raise ValueError('only elliptic orbits are propagated')
+        true_anomaly = self.true_anomaly
+        anomaly = math.atan2(math.sqrt(1 - e ** 2) * math.sin(true_anomaly), e + math.cos(true_anomaly))
+        return anomaly, anomaly - e * math.sin(anomaly)
+
+    def _mean_motion(self):
+        return math.sqrt(self.mu / self.semi_major_axis ** 3)
+
+
+def _true_anomaly(eccentric_anomaly, e):
+    # continuous in the eccentric anomaly, so full revolutions are kept
+    beta = e / (1 + math.sqrt(1 - e ** 2))
+    return eccentric_anomaly + 2 * math.atan2(beta * math.sin(eccentric_anomaly),
+                                              1 - beta * math.cos(eccentric_anomaly))
+
+
+def orbit_elements(height, velocity, gamma):
+    """Computes the orbit elements for whole arrays of heights, velocities and flight path angles.
+
+    Returns a dict with the arrays of the semi-major axis, eccentricity, periapsis and apoapsis heights.
+    """
+    height = np.asarray(height, dtype=float)
+    velocity = np.asarray(velocity, dtype=float)
+    distance = physics.earth_radius + height
+    energy = 0.5 * velocity ** 2 - mu / distance
+    semi_major_axis = -mu / (2 * energy)
+    angular_momentum = distance * velocity * np.cos(gamma)
+    eccentricity = np.sqrt(1 + 2 * energy * angular_momentum ** 2 / (mu ** 2))
+    return {'semi_major_axis': semi_major_axis,
+            'eccentricity': eccentricity,
+            'periapsis_height': semi_major_axis * (1 - eccentricity) - physics.earth_radius,
+            'apoapsis_height': semi_major_axis * (1 + eccentricity) - physics.earth_radius}
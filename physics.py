@@ -18,29 +18,39 @@ class Physics:
         return 1.2 * math.e ** (-1.244268 * (10 ** -4) * height)
 
     @staticmethod
-    def acceleration_in_dir_of_flight(thrust, state, effective_area, sim):
+    def acceleration_in_dir_of_flight(thrust, state, effective_area, sim, density=None, gravity=None):
+        if density is None:
+            density = Physics.atmospheric_density(state.h)
+        if gravity is None:
+            gravity = Physics.gravitational_acceleration(state.h)
         T = thrust * math.cos(state.a)  # in the direction of the flight
-        D = Physics.atmospheric_density(state.h) * (state.v ** 2) * effective_area * 0.5
-        Fg = state.m * Physics.gravitational_acceleration(state.h) * math.sin(state.gamma)
+        D = density * (state.v ** 2) * effective_area * 0.5
+        Fg = state.m * gravity * math.sin(state.gamma)
         sim.loss_drag += D / state.m * sim.time_step
         sim.loss_gravity += Fg / state.m * sim.time_step
         sim.deltaV += T / state.m * sim.time_step
         return (T - D - Fg) / state.m
 
     @staticmethod
-    def nose_heat_flux(temperature, velocity, height, effective_radius, emmisivity=.8):
+    def nose_heat_flux(temperature, velocity, height, effective_radius, emmisivity=.8, density=None):
+        if density is None:
+            density = Physics.atmospheric_density(height)
         # sutton-graves
-        heat_flux_in = k * (velocity ** 3) * math.sqrt(Physics.atmospheric_density(height) / effective_radius)
+        heat_flux_in = k * (velocity ** 3) * math.sqrt(density / effective_radius)
         heat_flux_out = emmisivity * sigma * ((temperature ** 4) - (293 ** 4))
         return max(0, heat_flux_in - heat_flux_out)
 
     @staticmethod
-    def max_temperature(velocity, height, effective_radius, emmisivity=.8):
+    def max_temperature(velocity, height, effective_radius, emmisivity=.8, density=None):
+        if density is None:
+            density = Physics.atmospheric_density(height)
         return (k / (emmisivity * sigma) * (velocity ** 3) * math.sqrt(
-            Physics.atmospheric_density(height) / effective_radius) + 293 ** 4) ** (1 / 4)
+            density / effective_radius) + 293 ** 4) ** (1 / 4)
 
     @staticmethod
-    def angular_velocity(thrust, state):
+    def angular_velocity(thrust, state, gravity=None):
+        if gravity is None:
+            gravity = Physics.gravitational_acceleration(state.h)
         T = thrust * math.sin(state.a)  # perpendicular to the flight direction
-        c = (-Physics.gravitational_acceleration(state.h) + (state.v ** 2) / (earth_radius + state.h))
+        c = (-gravity + (state.v ** 2) / (earth_radius + state.h))
         return (math.cos(state.gamma) * c + T / state.m) / state.v
\ No newline at end of file
@@ -1,28 +1,73 @@
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
 
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.gridspec import GridSpec
-from matplotlib.widgets import Slider
-from matplotlib import animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Arrow, Circle
 
 import flight_sim
+from lod import LevelOfDetail, event_indices
+from orbit import Orbit
+from trajectory import Trajectory, DESCRIPTIONS
+from trajectory_file import load_trajectory
+
+# points traced along the orbit ellipse
+ELLIPSE_POINTS = 5000
+# frames rendered by a worker process at once
+CHUNK_SIZE = 8
+# time buckets of the graphs, about their width in pixels
+GRAPH_BUCKETS = 2000
 
 
 class Plotter:
     def __init__(self, result):
-        self.time = [state.t for state in result]
-        self.height = [state.h for state in result]
-        self.velocity = [state.v for state in result]
-        self.mass = [state.m for state in result]
-        self.angle = [state.a for state in result]
-        self.gamma = [state.gamma for state in result]
-        self.local_horizon = [state.local_horizon for state in result]
-        self.temperature = [state.temp for state in result]
-        self.description = [state.description for state in result]
-        self.orbit = [state.orbit for state in result]
+        """result is a Trajectory, a list of states or the path of a trajectory file."""
+        if isinstance(result, (str, os.PathLike)):
+            result = load_trajectory(result)
+        elif not isinstance(result, Trajectory):
+            trajectory = Trajectory(len(result))
+            for state in result:
+                trajectory.append(state)
+            result = trajectory
+
+        self.time = result.t
+        self.height = result.h
+        self.velocity = result.v
+        self.mass = result.m
+        self.angle = result.a
+        self.gamma = result.gamma
+        self.local_horizon = result.local_horizon
+        self.temperature = result.temp
+        self.description_codes = result.description_codes
+
+    def orbit(self, idx):
+        return Orbit(float(self.height[idx]), float(self.velocity[idx]), float(self.gamma[idx]))
+
+    def description(self, idx):
+        return DESCRIPTIONS[self.description_codes[idx]]
+
+    def graph_indices(self):
+        """Indices of the states drawn in the graphs, their extremes and events per time bucket."""
+        columns = {'height': self.height, 'velocity': self.velocity, 'mass': self.mass,
+                   'temperature': self.temperature}
+        levels = LevelOfDetail(self.time, columns, event_indices(self.mass, self.description_codes))
+        return levels.indices(GRAPH_BUCKETS)
+
+    def time_index(self, time):
+        """Index of the state closest to the given time, found by binary search."""
+        idx = int(np.searchsorted(self.time, time))
+        if idx == len(self.time) or (idx > 0 and time - self.time[idx - 1] < self.time[idx] - time):
+            idx -= 1
+        return idx
 
     def plot(self):
+        # pyplot and its gui backend are only needed for the interactive window
+        import matplotlib.pyplot as plt
+        from matplotlib.gridspec import GridSpec
+        from matplotlib.widgets import Slider
+
         fig = plt.figure(figsize=(10, 8))
         gs = GridSpec(4, 2, width_ratios=[1, 1])
         ax1 = fig.add_subplot(gs[0, 1])
@@ -51,10 +96,7 @@ class Plotter:
         dynamic_elements = self._initialize_frame(fig, ax_left, ax1, ax2, ax3, ax4, text)
 
         def update_trajectory(val):
-            time = val
-            # closest time index
-            idx = min(range(len(self.time)), key=lambda j: abs(self.time[j] - time))
-            self._update_frame(idx, *dynamic_elements)
+            self._update_frame(self.time_index(val), *dynamic_elements)
 
         # attach the update function to the slider
         time_slider.on_changed(update_trajectory)
@@ -64,26 +106,29 @@ class Plotter:
 
     def _initialize_frame(self, fig, ax_left, ax1, ax2, ax3, ax4, text):
         # draw the earth
-        earth = plt.Circle((0, 0), flight_sim.earth_radius, color='black')
+        earth = Circle((0, 0), flight_sim.earth_radius, color='black')
         ax_left.add_artist(earth)
         ax_left.set_title('Trajectory')
         ax_left.set_xlabel('x [m]')
         ax_left.set_ylabel('y [m]')
+        ax_left.set_aspect('equal')
 
         # Plot static graphs and create marker points for dynamic updates
-        ax1.plot(self.time, [h * 0.001 for h in self.height])
+        idx = self.graph_indices()
+        time = self.time[idx]
+        ax1.plot(time, self.height[idx] * 0.001)
         height_pos, = ax1.plot((0, 0), 'o', color='black')
         ax1.set_ylabel('Height [km]')
 
-        ax2.plot(self.time, self.velocity)
+        ax2.plot(time, self.velocity[idx])
         vel_pos, = ax2.plot((0, 0), 'o', color='black')
         ax2.set_ylabel('Velocity [m/s]')
 
-        ax3.plot(self.time, [m * 0.001 for m in self.mass])
+        ax3.plot(time, self.mass[idx] * 0.001)
         mass_pos, = ax3.plot((0, 0), 'o', color='black')
         ax3.set_ylabel('Mass [t]')
 
-        ax4.plot(self.time, [t - 273.15 for t in self.temperature])
+        ax4.plot(time, self.temperature[idx] - 273.15)
         temp_pos, = ax4.plot((0, 0), 'o', color='black')
         ax4.set_ylabel('max. Temperature [°C]')
         ax4.set_xlabel('Time [s]')
@@ -91,15 +136,22 @@ class Plotter:
         # Initialize dynamic plot elements for trajectory
         rocket_line, = ax_left.plot([], [], color='green', marker='o', markersize=5)
         ellipse_line, = ax_left.plot([], [], color='red')
-        rocket_arrow = plt.Arrow(0, 0, 0, 0, width=1, color='green')
+        rocket_arrow = Arrow(0, 0, 0, 0, width=1, color='green')
         ax_left.add_artist(rocket_arrow)
+        # invisible points defining the min size of the trajectory plot
+        bounds, = ax_left.plot([], [], color='black', marker='o', markersize=.1, linestyle='')
 
-        return (fig, ax_left, earth, rocket_line, ellipse_line, rocket_arrow,
+        return (fig, ax_left, bounds, rocket_line, ellipse_line, rocket_arrow,
                 height_pos, mass_pos, vel_pos, temp_pos, text)
 
-    def _update_frame(self, idx, fig, ax_left, earth, rocket_line, ellipse_line, rocket_arrow,
-                      height_pos, mass_pos, vel_pos, temp_pos, text):
-        orbit = self.orbit[idx]
+    def _update_frame(self, idx, *dynamic_elements):
+        self._set_frame(idx, *dynamic_elements)
+        dynamic_elements[0].canvas.draw_idle()  # Redraw the figure
+
+    def _set_frame(self, idx, fig, ax_left, bounds, rocket_line, ellipse_line, rocket_arrow,
+                   height_pos, mass_pos, vel_pos, temp_pos, text):
+        """Updates the dynamic elements to the state at idx without drawing."""
+        orbit = self.orbit(idx)
 
         # find the intersections with a circle with the radius with earth and height of the rocket
         intersections_earth = self.ellipse_circle_intersections(orbit, flight_sim.earth_radius)
@@ -112,56 +164,39 @@ class Plotter:
         offset_angle = self.local_horizon[idx] - (intersections_rocket[1 if ascending else 0] - np.pi)
 
         # trace the ellipse between the first and second earth intersections
-        x = []
-        y = []
-        try:
-            angle = intersections_earth[0]
-            delta = intersections_earth[1] - intersections_earth[0]
-            for i in range(5000):
-                r = orbit.semi_major_axis * (1 - orbit.eccentricity**2) / (1 + orbit.eccentricity * math.cos(angle))
-                # adding the offset angle rotates the ellipse
-                x.append(r * math.sin(angle - offset_angle))
-                y.append(-r * math.cos(angle - offset_angle))
-
-                angle += delta / 5000
-
-        except ZeroDivisionError:
-            pass
+        delta = intersections_earth[1] - intersections_earth[0]
+        angle = intersections_earth[0] + delta / ELLIPSE_POINTS * np.arange(ELLIPSE_POINTS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = orbit.semi_major_axis * (1 - orbit.eccentricity**2) / (1 + orbit.eccentricity * np.cos(angle))
+        # stop at a division by zero, as the pure python loop used to
+        invalid = ~np.isfinite(r)
+        if invalid.any():
+            r = r[:invalid.argmax()]
+            angle = angle[:len(r)]
+        # adding the offset angle rotates the ellipse
+        ellipse_line.set_data(r * np.sin(angle - offset_angle), -r * np.cos(angle - offset_angle))
 
         distance = orbit.distance
         rocket_pos = distance * math.sin(self.local_horizon[idx]), distance * math.cos(self.local_horizon[idx])
+        rocket_line.set_data([rocket_pos[0]], [rocket_pos[1]])
 
-        # Update the plots
-        ax_left.clear()
-        # redraw static earth circle and set labels and aspect
-        ax_left.add_artist(earth)
-        ax_left.set_title('Trajectory')
-        ax_left.set_xlabel('x [m]')
-        ax_left.set_ylabel('y [m]')
-        ax_left.set_aspect('equal')
-
+        # orient the rocket arrow in the direction of flight
+        height = self.height[idx]
         velocity_angle = self.local_horizon[idx] + (np.pi/2 - self.gamma[idx])
-        # Create new rocket arrow with updated position and orientation
-        new_rocket_arrow = plt.Arrow(rocket_pos[0], rocket_pos[1], self.height[idx] * math.sin(velocity_angle),
-                                    self.height[idx] * math.cos(velocity_angle), width=self.height[idx] / 20, color='green')
-        ax_left.add_artist(new_rocket_arrow)
-
-        # Update ellipse line
-        ellipse_line, = ax_left.plot(x, y, color='red')
-        # Update rocket position point
-        rocket_line, = ax_left.plot(rocket_pos[0], rocket_pos[1], color='green', marker='o', markersize=5)
+        rocket_arrow.set_data(rocket_pos[0], rocket_pos[1], height * math.sin(velocity_angle),
+                              height * math.cos(velocity_angle), width=height / 20)
 
         # plot apoapsis and periapsis heights under the graph
         text.set_text(f"$r_p$ = {round(orbit.periapsis_height / 1000,1)} km\n"
                       f"$r_a$ = {round(orbit.apoapsis_height / 1000,1)} km\n"
                       f"$m_{{remaining}}$ = {round(self.mass[idx] * 0.001, 3)} t\n"
-                      f"state: {self.description[idx]}")
+                      f"state: {self.description(idx)}")
 
-        # plot additional points to define min size for t=0
-        ax_left.plot(-10, flight_sim.earth_radius, color='black', marker='o', markersize=.1)
-        ax_left.plot(10, flight_sim.earth_radius, color='black', marker='o', markersize=.1)
-        ax_left.plot(rocket_pos[0], max(10, 2 * self.height[idx]) + flight_sim.earth_radius, color='black',
-                     marker='o', markersize=.1)
+        # points to define min size for t=0
+        bounds.set_data([-10, 10, rocket_pos[0]],
+                        [flight_sim.earth_radius, flight_sim.earth_radius, max(10, 2 * height) + flight_sim.earth_radius])
+        ax_left.relim()
+        ax_left.autoscale_view()
 
         # plot points to show current value in the graphs
         height_pos.set_data([self.time[idx]], [0.001 * self.height[idx]])
@@ -169,33 +204,57 @@ class Plotter:
         vel_pos.set_data([self.time[idx]], [self.velocity[idx]])
         temp_pos.set_data([self.time[idx]], [self.temperature[idx] - 273.15])
 
-        fig.canvas.draw_idle()  # Redraw the figure
+    def export_gif(self, filename="trajectory.gif", frame_interval=20, fps=10, hold_frames=10, workers=None):
+        """Renders the flight into an animation, a gif or any format of imageio like mp4.
+
+        A frame is drawn every frame_interval seconds of flight time and the last state is held for
+        hold_frames frames. The frames are rendered in chunks by worker processes and passed on to
+        the encoder in order as they arrive.
+        """
+        frames = self.frame_indices(frame_interval)
+        chunks = [frames[i:i + CHUNK_SIZE] for i in range(0, len(frames), CHUNK_SIZE)]
+
+        with _FrameWriter(filename, fps) as writer:
+            if workers == 1:
+                _start_worker(self)
+                self._write_frames(writer, map(_render_frames, chunks), hold_frames)
+            else:
+                # the plotter is sent once to every worker, which keeps its figure for all its chunks
+                with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(self,)) as executor:
+                    self._write_frames(writer, executor.map(_render_frames, chunks), hold_frames)
+
+    def frame_indices(self, frame_interval):
+        """Indices of the states closest to every frame_interval seconds of flight, always with the last one."""
+        times = np.arange(self.time[0], self.time[-1], frame_interval)
+        indices = np.searchsorted(self.time, times)
+        return sorted(set(indices.tolist()) | {len(self.time) - 1})
 
-    def export_gif(self, filename="trajectory.gif"):
-        fig = plt.figure(figsize=(10, 8))
-        gs = GridSpec(4, 2, width_ratios=[1, 1])
+    @staticmethod
+    def _write_frames(writer, rendered, hold_frames):
+        frame = None
+        for chunk in rendered:
+            for frame in chunk:
+                writer.write(frame)
+        for _ in range(hold_frames):
+            writer.write(frame)
+
+    def _export_figure(self):
+        """Builds a figure of the export layout outside of pyplot and returns its dynamic elements."""
+        fig = Figure(figsize=(10, 8))
+        FigureCanvasAgg(fig)
+        gs = fig.add_gridspec(4, 2, width_ratios=[1, 1])
         ax1 = fig.add_subplot(gs[0, 1])
         ax2 = fig.add_subplot(gs[1, 1], sharex=ax1)
         ax3 = fig.add_subplot(gs[2, 1], sharex=ax1)
         ax4 = fig.add_subplot(gs[3, 1], sharex=ax1)
         ax_left = fig.add_subplot(gs[:, 0])
 
-        plt.subplots_adjust(bottom=0.25, hspace=0.5)
+        fig.subplots_adjust(bottom=0.25, hspace=0.5)
 
-        text = plt.text(0.5, .6, "s", fontsize=12)
+        # below the graphs, as the trajectory axes are no longer cleared on every frame
+        text = fig.text(0.1, 0.05, "s", fontsize=12)
 
-        # Initialize frame and get dynamic elements
-        dynamic_elements = self._initialize_frame(fig, ax_left, ax1, ax2, ax3, ax4, text)
-
-        def animate(frame_idx):
-            self._update_frame(frame_idx, *dynamic_elements)
-            return []
-
-        step = 2000
-        frames = list(range(0, len(self.time), step)) + [len(self.time) - 1] * 10
-        anim = animation.FuncAnimation(fig, animate, frames=frames, interval=100, blit=True)
-        anim.save(filename, writer='pillow')
-        plt.close(fig)
+        return self._initialize_frame(fig, ax_left, ax1, ax2, ax3, ax4, text)
 
     @staticmethod
     def ellipse_circle_intersections(orbit, R):
@@ -212,3 +271,83 @@ class Plotter:
         intersection_points = [theta1, theta2]
 
         return intersection_points
+
+
+# plotter and figure elements of a rendering worker process
+_worker = None
+
+
+def _start_worker(plotter):
+    """Builds the export figure and draws its static graphs once, for blitting the frames onto them."""
+    global _worker
+    dynamic_elements = plotter._export_figure()
+    fig, ax_left = dynamic_elements[:2]
+    # the trajectory axes, the markers and the text change with every frame
+    animated = (ax_left,) + dynamic_elements[-5:]
+    for artist in animated:
+        artist.set_animated(True)
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(fig.bbox)
+    _worker = plotter, dynamic_elements, animated, background
+
+
+def _render_frames(indices):
+    """Renders a chunk of frames in a worker process and returns them as RGB arrays."""
+    plotter, dynamic_elements, animated, background = _worker
+    fig = dynamic_elements[0]
+    frames = []
+    for idx in indices:
+        plotter._set_frame(idx, *dynamic_elements)
+        fig.canvas.restore_region(background)
+        for artist in animated:
+            fig.draw_artist(artist)
+        frames.append(np.asarray(fig.canvas.buffer_rgba())[:, :, :3].copy())
+    return frames
+
+
+class _FrameWriter:
+    """Streams frames to an imageio writer, or writes them to a gif with pillow if imageio is not installed."""
+
+    def __init__(self, filename, fps):
+        self.filename = filename
+        self.fps = fps
+        self._file = None
+        try:
+            import imageio
+        except ImportError:
+            if not filename.lower().endswith('.gif'):
+                raise ImportError(f'imageio is required to export {filename}, only gifs are written without it')
+            self._writer = None
+        else:
+            options = {'loop': 0, 'duration': 1000 / fps} if filename.lower().endswith('.gif') else {'fps': fps}
+            self._writer = imageio.get_writer(filename, **options)
+
+    def write(self, frame):
+        if self._writer is not None:
+            self._writer.append_data(frame)
+            return
+
+        from PIL import GifImagePlugin, Image
+
+        # palette images, the plots only use few colors, each frame with its own palette
+        image = Image.fromarray(frame).quantize(method=Image.Quantize.FASTOCTREE)
+        if self._file is None:
+            self._file = open(self.filename, 'wb')
+            self._file.write(b''.join(GifImagePlugin.getheader(image, info={'loop': 0})[0]))
+        for data in GifImagePlugin.getdata(image, duration=1000 / self.fps, include_color_table=True):
+            self._file.write(data)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif self._file is not None:
+            # gif trailer
+            self._file.write(b';')
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
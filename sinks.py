@@ -0,0 +1,81 @@
+import numpy as np
+
+from trajectory import Trajectory, STATE_FIELDS, ORBIT_FIELDS, FIELDS, DESCRIPTION_CODES
+
+
+class Sink:
+    """Receives the flight states of a running simulation, see FlightSim.simulate_to.
+
+    write is called with the current state, which is reused by the simulation and must be copied
+    if it is kept. close is called once the simulation has ended.
+    """
+
+    def write(self, state):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class TrajectorySink(Sink):
+    """Collects the states in a Trajectory."""
+
+    def __init__(self):
+        self.trajectory = Trajectory()
+
+    def write(self, state):
+        self.trajectory.append(state)
+
+
+class CsvSink(Sink):
+    """Writes one line per state to a csv file."""
+
+    def __init__(self, filename):
+        self.file = open(filename, 'w')
+        self.file.write(','.join(FIELDS + ('description',)) + '\n')
+
+    def write(self, state):
+        values = ([getattr(state, name) for name in STATE_FIELDS]
+                  + [getattr(state.orbit, name) for name in ORBIT_FIELDS])
+        self.file.write(','.join(repr(float(value)) for value in values) + f',{state.description}\n')
+
+    def close(self):
+        self.file.close()
+
+
+class BinarySink(Sink):
+    """Writes the states as records of little endian float64 values to a file.
+
+    Every record holds the STATE_FIELDS of the trajectory module followed by the description code. The
+    records are buffered and written in chunks, so memory stays flat for any length of flight.
+    """
+
+    def __init__(self, filename, chunk_size=4096):
+        self.file = open(filename, 'wb')
+        self._buffer = np.empty((chunk_size, len(STATE_FIELDS) + 1), dtype='<f8')
+        self._size = 0
+
+    def write(self, state):
+        record = self._buffer[self._size]
+        for i, name in enumerate(STATE_FIELDS):
+            record[i] = getattr(state, name)
+        record[-1] = DESCRIPTION_CODES[state.description]
+
+        self._size += 1
+        if self._size == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        self.file.write(self._buffer[:self._size].tobytes())
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_binary_records(filename):
+    """Reads a file written by BinarySink into a Trajectory."""
+    records = np.fromfile(filename, dtype='<f8').reshape(-1, len(STATE_FIELDS) + 1)
+    columns = {name: records[:, i] for i, name in enumerate(STATE_FIELDS)}
+    return Trajectory.from_columns(columns, records[:, -1].astype(np.int8))
@@ -0,0 +1,228 @@
+"""Sensitivities of the final orbit and gradient based targeting of the ascent parameters.
+
+The sensitivities are central finite differences through the integrator: the nominal flight and a
+pair of flights with each parameter moved up and down by its step. By default the flights use the
+rk45 integrator, which locates the engine cutoff, apoapsis and end of the circularization burn inside
+a step, so the final orbit changes smoothly with the parameters. The fixed euler steps move these
+events in whole steps, which makes the differences noisy.
+
+Targeting moves the parameters with Gauss-Newton steps until the final orbit hits the targets, e.g.
+
+    targeting = Targeting(stages, GravityTurn(1000, 3500, 3), 400000, parameters=('turn_angle', 'target_orbit'))
+    result = targeting.solve({'apoapsis_height': 400000, 'periapsis_height': 390000})
+    print(result.report())
+
+Every iteration simulates 2 * len(parameters) + 1 flights, and one more for every halving of a step
+that misses the targets by more than the flight before it.
+"""
+import math
+import re
+
+import numpy as np
+
+from flight_sim import FlightSim, GravityTurn
+from optimizer import DEFAULT_BOUNDS
+
+# final values of a flight that are differentiated and targeted
+METRICS = ('apoapsis_height', 'periapsis_height', 'fuel_left')
+# default tolerances of the targets, m and kg
+TOLERANCES = {'apoapsis_height': 500, 'periapsis_height': 500, 'fuel_left': 1}
+
+# finite difference steps of the ascent parameters in m and degrees, stage masses use MASS_STEP of their value
+STEPS = {'turn_start': 10, 'turn_end': 10, 'turn_angle': 0.01, 'target_orbit': 100}
+MASS_STEP = 0.001
+
+# halvings of a Gauss-Newton step before targeting gives up
+LINE_SEARCH_STEPS = 8
+
+# stage masses are parameters by stage number, e.g. propellant_mass_1 of the first stage
+_STAGE_PARAMETER = re.compile(r'(structure_mass|propellant_mass)_(\d+)$')
+
+
+class Sensitivities:
+    """Final metrics of the nominal flight and their derivatives by the parameters.
+
+    jacobian[i, k] is the derivative of METRICS[i] by parameters[k].
+    """
+
+    def __init__(self, parameters, values, metrics, jacobian):
+        self.parameters = parameters
+        self.values = values
+        self.metrics = metrics
+        self.jacobian = jacobian
+
+    def derivative(self, metric, parameter):
+        return self.jacobian[METRICS.index(metric), self.parameters.index(parameter)]
+
+    def report(self):
+        lines = []
+        for i, metric in enumerate(METRICS):
+            derivatives = ', '.join(f'd/d{name} {self.jacobian[i, k]:.4g}' for k, name in enumerate(self.parameters))
+            lines.append(f'{metric} {self.metrics[i]:.1f}: {derivatives}')
+        return '\n'.join(lines)
+
+
+class TargetingResult:
+    def __init__(self, targeting, sensitivities, iterations, flights, converged):
+        self.stages, self.gravity_turn, self.target_orbit = targeting.configuration(sensitivities.values)
+        self.values = dict(zip(targeting.parameters, sensitivities.values.tolist()))
+        self.metrics = dict(zip(METRICS, sensitivities.metrics.tolist()))
+        self.sensitivities = sensitivities
+        self.iterations = iterations
+        self.flights = flights
+        self.converged = converged
+
+    def report(self):
+        status = 'converged' if self.converged else 'not converged'
+        values = ', '.join(f'{name} {value:.6g}' for name, value in self.values.items())
+        metrics = ', '.join(f'{name} {value:.1f}' for name, value in self.metrics.items())
+        return f'{status} after {self.iterations} iterations ({self.flights} flights): {values}\n{metrics}'
+
+
+class Targeting:
+    """Finds ascent parameters that put the final orbit on given targets.
+
+    parameters are names of the gravity turn (turn_start, turn_end, turn_angle), the target orbit whose
+    apoapsis ends the ascent burn (and so sets the engine cutoff time), or stage masses in tons
+    (structure_mass_i, propellant_mass_i for stage number i). steps overrides the finite difference
+    steps and bounds the ranges of the parameters, by default DEFAULT_BOUNDS of the optimizer module.
+    """
+
+    def __init__(self, stages, gravity_turn, target_orbit=0, circularize=True, time_step=0.1, integrator='rk45',
+                 parameters=('turn_angle', 'target_orbit'), steps=None, bounds=None, atmosphere=None,
+                 gravity=None):
+        self.stages = stages
+        self.gravity_turn = gravity_turn
+        self.target_orbit = target_orbit
+        self.circ = circularize
+        self.time_step = time_step
+        self.integrator = integrator
+        self.parameters = tuple(parameters)
+        self.atmosphere = atmosphere
+        self.gravity = gravity
+        self.values = np.array([self._initial_value(name) for name in self.parameters], dtype=float)
+
+        steps = steps or {}
+        self._steps = np.array([steps.get(name, STEPS.get(name, 0)) for name in self.parameters], dtype=float)
+        self._relative_steps = np.array([name not in steps and name not in STEPS for name in self.parameters])
+        bounds = {**DEFAULT_BOUNDS, **(bounds or {})}
+        self._low, self._high = np.array([bounds.get(name, (0, math.inf)) for name in self.parameters],
+                                         dtype=float).T.reshape(2, -1)
+
+    def configuration(self, values):
+        """Returns the stages, gravity turn and target orbit for a vector of parameter values."""
+        values = dict(zip(self.parameters, values))
+        turn = self.gravity_turn
+        gravity_turn = GravityTurn(values.get('turn_start', turn.start), values.get('turn_end', turn.end),
+                                   values.get('turn_angle', turn.angle))
+        stages = [type(stage)(values.get(f'structure_mass_{i}', stage.structure_mass),
+                              values.get(f'propellant_mass_{i}', stage.propellant_mass), stage.specific_impulse,
+                              stage.propellant_mass_flux, stage.payload_mass)
+                  for i, stage in enumerate(self.stages, 1)]
+        return stages, gravity_turn, values.get('target_orbit', self.target_orbit)
+
+    def steps(self, values):
+        """Finite difference step of every parameter at the given values."""
+        return np.where(self._relative_steps, MASS_STEP * np.abs(values), self._steps)
+
+    def sensitivities(self, values=None, metrics=None):
+        """Simulates the flight at the values and with every parameter moved up and down by its step.
+
+        metrics are the final METRICS of the flight at the values if it was already simulated. Where one of
+        the moved flights fails the derivative is the one sided difference of the other one, nan if both fail.
+        """
+        values = self.values if values is None else np.asarray(values, dtype=float)
+        steps = self.steps(values)
+        lanes = []
+        for k in range(len(values)):
+            for direction in (1, -1):
+                lane = values.copy()
+                lane[k] += direction * steps[k]
+                lanes.append(lane)
+
+        nominal = self.simulate(values) if metrics is None else metrics
+        final = np.array([nominal] + [self.simulate(lane) for lane in lanes]).T
+        up, down = final[:, 1::2], final[:, 2::2]
+        one_sided = np.where(np.isfinite(up), up - final[:, :1], final[:, :1] - down) / steps
+        jacobian = np.where(np.isfinite(up) & np.isfinite(down), (up - down) / (2 * steps), one_sided)
+        return Sensitivities(self.parameters, values, final[:, 0], jacobian)
+
+    def simulate(self, values):
+        """Final METRICS of the flight with the given parameter values, nan if it fails."""
+        stages, gravity_turn, target_orbit = self.configuration(values)
+        sim = FlightSim(stages, gravity_turn, target_orbit, self.circ, self.time_step, self.integrator,
+                        atmosphere=self.atmosphere, gravity=self.gravity, verbose=False)
+        state = None
+        try:
+            for state in sim.simulate_iter():
+                pass
+            return [float(state.orbit.apoapsis_height), float(state.orbit.periapsis_height),
+                    float(state.m - sim.vehicle.final_dry_mass)]
+        except (ArithmeticError, ValueError):
+            # e.g. a math domain error of a rocket falling back to earth
+            return [math.nan] * len(METRICS)
+
+    def solve(self, targets, tolerances=None, max_iterations=10):
+        """Moves the parameters until every targeted metric is within its tolerance of the target.
+
+        targets maps names of METRICS to their values. Every iteration takes the least squares step of
+        the linearized metrics, a step that does not reduce the miss is halved and only the flight at the
+        halved step is simulated again. Parameters without finite derivatives stay where they are.
+        """
+        unknown = set(targets) - set(METRICS)
+        if unknown:
+            raise ValueError(f'unknown targets {sorted(unknown)}')
+        rows = [METRICS.index(name) for name in targets]
+        goal = np.array(list(targets.values()), dtype=float)
+        tolerances = {**TOLERANCES, **(tolerances or {})}
+        tolerance = np.array([tolerances[name] for name in targets], dtype=float)
+
+        sensitivities = self.sensitivities()
+        flights = 2 * len(self.parameters) + 1
+        # misses in multiples of the tolerance
+        miss = (sensitivities.metrics[rows] - goal) / tolerance
+        if not np.isfinite(miss).all():
+            raise ValueError('the initial flight does not reach an orbit')
+
+        iteration = 0
+        while not np.all(np.abs(miss) <= 1):
+            if iteration == max_iterations:
+                return TargetingResult(self, sensitivities, iteration, flights, False)
+            iteration += 1
+
+            # solved in units of the parameter steps, so the parameters are weighted alike
+            values = sensitivities.values
+            scale = self.steps(values)
+            jacobian = sensitivities.jacobian[rows] / tolerance[:, np.newaxis] * scale
+            usable = np.isfinite(jacobian).all(axis=0)
+            step = np.zeros_like(values)
+            step[usable] = np.linalg.lstsq(jacobian[:, usable], -miss, rcond=None)[0] * scale[usable]
+
+            for _ in range(LINE_SEARCH_STEPS):
+                trial = self._clip(values + step)
+                metrics = self.simulate(trial)
+                flights += 1
+                trial_miss = (np.array(metrics)[rows] - goal) / tolerance
+                if np.linalg.norm(trial_miss) < np.linalg.norm(miss):
+                    break
+                step = step / 2
+            else:
+                return TargetingResult(self, sensitivities, iteration, flights, False)
+
+            sensitivities = self.sensitivities(trial, metrics)
+            flights += 2 * len(self.parameters)
+            miss = trial_miss
+        return TargetingResult(self, sensitivities, iteration, flights, True)
+
+    def _clip(self, values):
+        return np.clip(values, self._low, self._high)
+
+    def _initial_value(self, name):
+        if name in ('turn_start', 'turn_end', 'turn_angle'):
+            return getattr(self.gravity_turn, name[len('turn_'):])
+        if name == 'target_orbit':
+            return self.target_orbit
+        match = _STAGE_PARAMETER.match(name)
+        if match and 1 <= int(match[2]) <= len(self.stages):
+            return getattr(self.stages[int(match[2]) - 1], match[1])
+        raise ValueError(f'unknown parameter {name}')
@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# the modules of the simulator are imported from the top level of the repository
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from input_reader import read_staging_output  # noqa: E402
+
+INPUT_FILE = str(ROOT / 'input.txt')
+
+
+@pytest.fixture
+def stages():
+    """The two stages of input.txt."""
+    return list(read_staging_output(INPUT_FILE))
+
+
+@pytest.fixture
+def flight(stages):
+    """Builds FlightSims of the input.txt stages, by default circularizing at 400 km after GravityTurn(1000, 3500, 3)
+    with 0.1 s steps."""
+    from flight_sim import FlightSim, GravityTurn
+
+    def flight(target_orbit=400000, circularize=True, gravity_turn=(1000, 3500, 3), time_step=0.1, **options):
+        return FlightSim(stages, GravityTurn(*gravity_turn), target_orbit, circularize, time_step=time_step,
+                         verbose=False, **options)
+
+    return flight
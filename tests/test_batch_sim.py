@@ -0,0 +1,54 @@
+import numpy as np
+
+from batch_sim import BatchFlightSim
+from environment import ExponentialAtmosphere, ScaledAtmosphere
+from flight_sim import FlightSim, GravityTurn
+from trajectory import STATE_FIELDS
+
+CONFIGURATIONS = [((1000, 3500, 3), 400000, True), ((1000, 3500, 3), 300000, False), ((2000, 2500, 1), 200000, True)]
+
+
+def test_lanes_match_flight_sim(stages):
+    turns = [GravityTurn(*turn) for turn, _, _ in CONFIGURATIONS]
+    result = BatchFlightSim([stages] * len(CONFIGURATIONS), turns, [target for _, target, _ in CONFIGURATIONS],
+                            [circularize for _, _, circularize in CONFIGURATIONS], time_step=0.05).simulate(record=True)
+
+    for i, (turn, target, circularize) in enumerate(CONFIGURATIONS):
+        sim = FlightSim(stages, turns[i], target, circularize, time_step=0.05, verbose=False)
+        trajectory = sim.simulate()
+        lane = result.trajectories[i]
+
+        assert len(lane) == len(trajectory)
+        for name in STATE_FIELDS:
+            if name == 'temp':
+                # numpy and math round the fourth root differently in the last bit
+                np.testing.assert_allclose(lane.temp, trajectory.temp, rtol=1e-12)
+            else:
+                np.testing.assert_array_equal(getattr(lane, name), getattr(trajectory, name))
+        assert lane.description == trajectory.description
+        assert (result.loss_gravity[i], result.loss_drag[i], result.deltaV[i]) == \
+            (sim.loss_gravity, sim.loss_drag, sim.deltaV)
+        assert result.fuel_left[i] == trajectory.m[-1] - sim.vehicle.final_dry_mass
+
+
+def test_lanes_with_own_time_steps(stages):
+    turns = [GravityTurn(1000, 3500, 3)] * 2
+    result = BatchFlightSim([stages] * 2, turns, 400000, False, time_step=[0.05, 0.1]).simulate()
+
+    for i, time_step in enumerate((0.05, 0.1)):
+        trajectory = FlightSim(stages, turns[i], 400000, False, time_step=time_step, verbose=False).simulate()
+        assert (result.t[i], result.h[i], result.v[i]) == (trajectory.t[-1], trajectory.h[-1], trajectory.v[-1])
+
+
+def test_lanes_with_own_atmosphere_scale(stages):
+    # the lanes finish one after the other, each with the scale of its own lane
+    turns = [GravityTurn(1000, 3500, angle) for angle in (2, 3, 4)]
+    scales = [0.5, 1, 2]
+    result = BatchFlightSim([stages] * 3, turns, 400000, True, time_step=0.1,
+                            atmosphere=ScaledAtmosphere(ExponentialAtmosphere(), np.array(scales))).simulate()
+
+    for i, scale in enumerate(scales):
+        sim = FlightSim(stages, turns[i], 400000, True, time_step=0.1, verbose=False,
+                        atmosphere=ScaledAtmosphere(ExponentialAtmosphere(), scale))
+        trajectory = sim.simulate()
+        assert (result.t[i], result.h[i], result.loss_drag[i]) == (trajectory.t[-1], trajectory.h[-1], sim.loss_drag)
@@ -0,0 +1,42 @@
+import pytest
+
+from cache import SimulationCache, physics_fingerprint, simulation_key
+
+def test_key_follows_the_compiled_vehicle(stages, flight):
+    sim = flight(circularize=False)
+    key = simulation_key(sim)
+    stages[-1].payload_mass += 0.1
+    assert simulation_key(sim) == key
+    assert simulation_key(flight(circularize=False)) != key
+
+
+def test_fingerprint_is_computed_once():
+    physics_fingerprint()
+    hits = physics_fingerprint.cache_info().hits
+    physics_fingerprint()
+    assert physics_fingerprint.cache_info().hits == hits + 1
+
+
+def test_cached_result_matches_the_run(flight, tmp_path):
+    cache = SimulationCache(str(tmp_path))
+    sim = flight(circularize=False)
+    result = cache.simulate(sim)
+    cached_sim = flight(circularize=False)
+    cached = cache.simulate(cached_sim)
+
+    assert (cached.h == result.h).all() and cached.description == result.description
+    assert (cached_sim.loss_gravity, cached_sim.loss_drag, cached_sim.deltaV) == \
+        (sim.loss_gravity, sim.loss_drag, sim.deltaV)
+
+
+@pytest.mark.parametrize('corruption', [b'', b'not an archive', 'truncated'])
+def test_corrupt_entry_is_a_miss(flight, tmp_path, corruption):
+    cache = SimulationCache(str(tmp_path))
+    expected = cache.simulate(flight(circularize=False))
+    path = tmp_path / (simulation_key(flight(circularize=False)) + '.npz')
+    content = path.read_bytes()
+    path.write_bytes(content[:len(content) // 2] if corruption == 'truncated' else corruption)
+
+    result = cache.simulate(flight(circularize=False))
+    assert (result.h == expected.h).all()
+    assert path.read_bytes() == content
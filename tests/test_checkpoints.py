@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from instrumentation import CheckpointRecorder, PhaseStats
+from trajectory import STATE_FIELDS
+
+
+@pytest.fixture
+def recorded(flight):
+    recorder = CheckpointRecorder()
+    sim = flight(hooks=[recorder])
+    return sim, sim.simulate(), recorder.checkpoints
+
+
+def test_events_are_recorded(recorded):
+    _, _, checkpoints = recorded
+    assert set(checkpoints) == {('ignition', 0), ('burnout', 0), ('ignition', 1), 'meco', 'circularization'}
+
+
+@pytest.mark.parametrize('event', [('ignition', 0), ('burnout', 0), ('ignition', 1), 'meco', 'circularization'])
+def test_resumed_flight_continues_the_full_one(flight, recorded, event):
+    full_sim, full, checkpoints = recorded
+    checkpoint = checkpoints[event]
+    sim = flight()
+    rest = sim.simulate(start=checkpoint)
+
+    # the states after the checkpoint, to the last bit
+    skipped = len(full) - len(rest)
+    if skipped:
+        assert full.t[skipped - 1] == checkpoint.state['t']
+    for name in STATE_FIELDS:
+        np.testing.assert_array_equal(getattr(rest, name), getattr(full, name)[skipped:])
+    assert rest.description == full.description[skipped:]
+    assert (sim.loss_gravity, sim.loss_drag, sim.deltaV) == \
+        (full_sim.loss_gravity, full_sim.loss_drag, full_sim.deltaV)
+
+
+@pytest.mark.parametrize('event, phases', [
+    (('ignition', 0), ['Stage 1', 'Stage 2', 'Coast', 'Circularization']),
+    (('burnout', 0), ['Stage 2', 'Coast', 'Circularization']),
+    (('ignition', 1), ['Stage 2', 'Coast', 'Circularization']),
+    ('meco', ['Coast', 'Circularization']),
+    ('circularization', ['Circularization']),
+])
+def test_resumed_flight_calls_the_hooks(flight, recorded, event, phases):
+    stats = PhaseStats()
+    rest = flight(hooks=[stats]).simulate(start=recorded[2][event])
+
+    assert list(stats.phases) == phases
+    assert sum(phase.steps for phase in stats.phases.values()) == len(rest)
+
+
+def test_resumed_flight_with_another_target(flight, recorded):
+    _, _, checkpoints = recorded
+    expected = flight(300000).simulate()
+    rest = flight(300000).simulate(start=checkpoints['burnout', 0])
+
+    np.testing.assert_array_equal(rest.h, expected.h[len(expected) - len(rest):])
+
+
+def test_checkpoints_only_during_events(flight, recorded):
+    with pytest.raises(ValueError):
+        flight().checkpoint()
+    rk45 = flight(integrator='rk45')
+    with pytest.raises(ValueError):
+        rk45.simulate(start=recorded[2]['meco'])
+
+
+@pytest.mark.parametrize('options', [{'integrator': 'rk45'}, {'backend': 'kernels'}])
+def test_recorder_skips_simulations_without_checkpoints(flight, options):
+    recorder = CheckpointRecorder()
+    sim = flight(hooks=[recorder], **options)
+    sim.simulate()
+
+    assert not sim.resumable and recorder.checkpoints == {}
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from environment import (ExponentialAtmosphere, InverseSquareGravity, StandardAtmosphere, TabulatedAtmosphere,
+                         TabulatedGravity, standard_earth_radius)
+
+# densities of the US standard atmosphere 1976 at the geopotential base heights of its layers in kg/m^3
+REFERENCE_DENSITIES = {0: 1.2250, 11000: 0.36392, 20000: 0.088035, 32000: 0.013225, 47000: 0.0014275,
+                       51000: 0.00086160, 71000: 0.000064211, 84852: 0.000006958}
+
+
+@pytest.mark.parametrize('geopotential_height, density', REFERENCE_DENSITIES.items())
+def test_standard_atmosphere_at_layer_boundaries(geopotential_height, density):
+    height = standard_earth_radius * geopotential_height / (standard_earth_radius - geopotential_height)
+    model = StandardAtmosphere()
+    assert model.density(height) == pytest.approx(density, rel=1e-4)
+    assert model.densities(np.array([height]))[0] == pytest.approx(model.density(height), rel=1e-12)
+
+
+@pytest.mark.parametrize('model, tabulated, tolerance', [
+    (StandardAtmosphere(), TabulatedAtmosphere(StandardAtmosphere()), 1e-4),
+    (ExponentialAtmosphere(), TabulatedAtmosphere(), 1e-6),
+])
+def test_atmosphere_table_interpolation_error(model, tabulated, tolerance):
+    heights = np.linspace(0, 300000, 30001) + 7.3
+    expected = model.densities(heights)
+    assert np.abs(tabulated.densities(heights) / expected - 1).max() < tolerance
+    for height in heights[::1000]:
+        assert tabulated.density(height) == pytest.approx(model.density(height), rel=tolerance)
+
+
+def test_table_outside_of_its_heights():
+    model = InverseSquareGravity()
+    tabulated = TabulatedGravity(model, max_height=1000)
+    assert tabulated.acceleration(5000) == model.acceleration(5000)
+    np.testing.assert_array_equal(tabulated.accelerations([-10, 5000]), model.accelerations([-10, 5000]))
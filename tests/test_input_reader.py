@@ -0,0 +1,90 @@
+import pytest
+
+from conftest import INPUT_FILE
+from input_reader import (parse_staging_output, read_configurations, read_staging_directory, read_staging_output,
+                          read_staging_table)
+
+STAGING = '''Payload: 300
+c_1: 3230
+c_2: 3350
+MassFlow_1: 62
+MassFlow_2: 12
+m_dry_1: 900
+m_dry_2: 110
+m_propellant_1: 12600
+m_propellant_2: 1000
+'''
+
+
+def test_input_file():
+    first, second = read_staging_output(INPUT_FILE)
+    assert first.structure_mass == 924.126331472018 / 1000
+    assert first.propellant_mass == 12659.2648146852 / 1000
+    assert (first.specific_impulse, first.propellant_mass_flux, first.payload_mass) == (3230, 61.919504643962846, 0)
+    assert second.payload_mass == 0.3
+    assert second.burn_time == 1005.04847330585 / 11.940298507462687
+
+
+def test_stage_values_in_tons():
+    first, second = parse_staging_output(STAGING)
+    assert (first.structure_mass, first.propellant_mass, first.payload_mass) == (0.9, 12.6, 0)
+    assert (second.structure_mass, second.propellant_mass, second.payload_mass) == (0.11, 1.0, 0.3)
+
+
+@pytest.mark.parametrize('text, message', [
+    (STAGING.replace('Payload: 300\n', ''), 'missing Payload'),
+    (STAGING.replace('c_2: 3350\n', ''), 'missing c_2'),
+    (STAGING.replace('_2:', '_3:'), 'not numbered from 1 without gaps'),
+    (STAGING.replace('MassFlow_1: 62', 'MassFlow_1: 0'), 'stage 1 needs a positive'),
+])
+def test_invalid_staging_output(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_staging_output(text, 'staging.txt')
+
+
+def test_directory(tmp_path):
+    (tmp_path / 'b.txt').write_text(STAGING)
+    (tmp_path / 'a.txt').write_text(STAGING.replace('Payload: 300', 'Payload: 200'))
+    (tmp_path / 'notes.md').write_text('not a staging file')
+
+    configurations = read_staging_directory(str(tmp_path))
+    assert list(configurations) == ['a.txt', 'b.txt']
+    assert configurations['a.txt'][-1].payload_mass == 0.2
+    assert read_configurations(str(tmp_path)).keys() == configurations.keys()
+
+
+def test_csv_table(tmp_path):
+    table = tmp_path / 'configurations.csv'
+    table.write_text('name,Payload,m_dry_1,m_propellant_1,c_1,MassFlow_1,m_dry_2,m_propellant_2,c_2,MassFlow_2\n'
+                     'two,300,900,12600,3230,62,110,1000,3350,12\n'
+                     'one,300,1000,13000,3300,60,,,,\n')
+
+    configurations = read_configurations(str(table))
+    assert list(configurations) == ['two', 'one']
+    assert len(configurations['two']) == 2
+    (stage,) = configurations['one']
+    assert (stage.structure_mass, stage.propellant_mass, stage.payload_mass) == (1.0, 13.0, 0.3)
+
+
+@pytest.mark.parametrize('content, message', [
+    ('m_dry_1,m_propellant_1,c_1,MassFlow_1\n900,12600,3230,62\n', 'missing Payload column'),
+    ('Payload,m_dry_1,m_propellant_1,c_1,MassFlow_1,m_dry_2,m_propellant_2,c_2,MassFlow_2\n'
+     '300,,,,,110,1000,3350,12\n', 'stage 2 without stage 1 in 0'),
+    ('Payload,m_dry_1,m_propellant_1,c_1,MassFlow_1\n300,,,,\n', 'configuration 0 has no stages or payload'),
+    ('Payload,m_dry_1,m_propellant_1,c_1,MassFlow_1\n300,900,12600,,62\n', 'missing c_1'),
+])
+def test_invalid_table(tmp_path, content, message):
+    table = tmp_path / 'configurations.csv'
+    table.write_text(content)
+    with pytest.raises(ValueError, match=message):
+        read_staging_table(str(table))
+
+
+def test_parquet_table(tmp_path):
+    pandas = pytest.importorskip('pandas')
+    pytest.importorskip('pyarrow')
+    table = str(tmp_path / 'configurations.parquet')
+    pandas.DataFrame({'Payload': [300.0], 'm_dry_1': [900.0], 'm_propellant_1': [12600.0], 'c_1': [3230.0],
+                      'MassFlow_1': [62.0]}).to_parquet(table)
+    (stage,) = read_configurations(table)['0']
+    assert stage.propellant_mass == 12.6
@@ -0,0 +1,16 @@
+import pytest
+
+from instrumentation import PhaseStats
+
+
+@pytest.mark.parametrize('options', [{}, {'integrator': 'rk45'}, {'backend': 'kernels'}])
+@pytest.mark.parametrize('circularize', [True, False])
+def test_phase_steps_add_up_to_the_trajectory(flight, options, circularize):
+    stats = PhaseStats()
+    sim = flight(circularize=circularize, hooks=[stats], **options)
+    trajectory = sim.simulate()
+
+    phases = ['Stage 1', 'Stage 2', 'Coast', 'Circularization'] if circularize else ['Stage 1', 'Stage 2']
+    assert list(stats.phases) == phases
+    assert sum(phase.steps for phase in stats.phases.values()) == len(trajectory)
+    assert sum(phase.evaluations for phase in stats.phases.values()) == sim.evaluations
@@ -0,0 +1,114 @@
+import math
+
+import pytest
+
+from flight_sim import State
+from instrumentation import SimulationHooks
+from integrators import RK4, RK45, find_event
+
+
+def oscillator(y):
+    return [y[1], -y[0]]
+
+
+def integrate(integrator, t_end):
+    y, t, dt = [1.0, 0.0], 0, integrator.initial_step
+    while t_end - t > 1e-12:
+        y, dt_taken, dt = integrator.step(oscillator, y, min(dt, t_end - t))
+        t += dt_taken
+    return y
+
+
+@pytest.mark.parametrize('rtol', [1e-6, 1e-9])
+def test_rk45_error_within_tolerance(rtol):
+    integrator = RK45(0.1, rtol=rtol, atol=rtol)
+    y = integrate(integrator, 10)
+    assert abs(y[0] - math.cos(10)) < 100 * rtol
+    assert abs(y[1] + math.sin(10)) < 100 * rtol
+
+
+def test_rk45_step_size_follows_tolerance():
+    coarse, fine = RK45(0.1, rtol=1e-4, atol=1e-4), RK45(0.1, rtol=1e-10, atol=1e-10)
+    integrate(coarse, 10)
+    integrate(fine, 10)
+    assert fine.evaluations > 4 * coarse.evaluations
+
+
+def test_rk45_rejects_too_large_steps():
+    _, dt_taken, dt_next = RK45(10, rtol=1e-9, atol=1e-9).step(oscillator, [1.0, 0.0], 10)
+    assert dt_taken < 10
+    assert dt_next < 10
+
+
+def test_rk4_is_fourth_order():
+    errors = [abs(integrate(RK4(dt), 1)[0] - math.cos(1)) for dt in (0.1, 0.05)]
+    assert 14 < errors[0] / errors[1] < 18
+
+
+def test_find_event_locates_sign_change():
+    # x(t) = cos(t) falls through 0.5 at t = pi / 3, the step starts at t = 1
+    dt, y = find_event(RK45(0.1), oscillator, [math.cos(1), -math.sin(1)], 0.2, lambda y, f: y[0] - 0.5,
+                       tolerance=1e-9)
+    assert dt == pytest.approx(math.pi / 3 - 1, abs=1e-8)
+    # the returned state already has the new sign
+    assert y[0] <= 0.5
+
+
+def test_find_event_counts_the_evaluations_of_the_event():
+    integrator = RK4(0.1)
+    dt, y = find_event(integrator, oscillator, [math.cos(1), -math.sin(1)], 0.2, lambda y, f: f(y)[1] + 0.5,
+                       tolerance=1e-3)
+    steps = integrator.evaluations // 5
+    # the start and every bisection run the event function and a step of four evaluations
+    assert integrator.evaluations == 5 * steps and steps > 5
+
+
+class EventTimes(SimulationHooks):
+    def __init__(self):
+        self.events = {}
+
+    def on_meco(self, sim, state):
+        self.events['meco'] = state.t
+        self.events['meco mass'] = state.m
+
+    def on_circularization(self, sim, state):
+        self.events['circularization'] = state.t
+
+
+def event_times(flight, integrator, time_step):
+    events = EventTimes()
+    sim = flight(200000, gravity_turn=(2000, 2500, 1), time_step=time_step, integrator=integrator, hooks=[events])
+    state = None
+    for state in sim.simulate_iter():
+        pass
+    return events.events, state
+
+
+def test_shutdown_condition_met_at_ignition(flight):
+    # the apoapsis is above the target when the last stage ignites, so it shuts off right away
+    euler_events, euler = event_times(flight, 'euler', 0.02)
+    rk45_events, rk45 = event_times(flight, 'rk45', 0.1)
+
+    assert rk45_events.keys() == euler_events.keys() == {'meco', 'meco mass', 'circularization'}
+    assert rk45_events['meco mass'] == euler_events['meco mass'] == flight().vehicle.ignition_mass[-1]
+    assert rk45_events['meco'] == pytest.approx(euler_events['meco'], abs=0.05)
+    assert rk45.t == pytest.approx(euler.t, abs=1)
+    assert rk45.orbit.apoapsis_height == pytest.approx(euler.orbit.apoapsis_height, rel=1e-2)
+    assert rk45.orbit.periapsis_height == pytest.approx(euler.orbit.periapsis_height, rel=1e-2)
+
+
+def test_descending_coast_is_at_apoapsis(flight):
+    sim = flight(integrator='rk45')
+    y = [7000, 200000, -0.1, 0, 500, 0, 0, 0]
+    steps = sim._integrate(RK45(0.1), State(), 0, y, sim.vehicle.schedules[-1], False, math.inf, [sim._apoapsis],
+                           'Waiting for apoapsis')
+    with pytest.raises(StopIteration) as stop:
+        next(steps)
+    assert stop.value.value == (0, y, sim._apoapsis)
+
+
+def test_coast_time_is_bounded(flight):
+    sim = flight(integrator='rk45')
+    # climbing on an elliptic orbit, and escaping without an apoapsis ahead
+    assert 0 < sim._coast_time_limit([7000, 200000, 0.1, 0, 500, 0, 0, 0]) < math.inf
+    assert sim._coast_time_limit([12000, 200000, 0.1, 0, 500, 0, 0, 0]) == 0
@@ -0,0 +1,24 @@
+import pytest
+
+from instrumentation import SimulationHooks
+
+
+class CircularizationState(SimulationHooks):
+    def on_circularization(self, sim, state):
+        self.values = state.t, state.h, state.v, state.gamma, state.local_horizon, state.m
+
+
+def test_kepler_coast_matches_stepped_coast(flight):
+    results = {}
+    for kepler_coast in (False, True):
+        hook = CircularizationState()
+        results[kepler_coast] = len(flight(kepler_coast=kepler_coast, hooks=[hook]).simulate()), hook.values
+
+    (stepped_count, stepped), (kepler_count, kepler) = results[False], results[True]
+    # the stepped coast passes the apoapsis by up to a step, and the Euler steps drift from the orbit
+    assert kepler[0] == pytest.approx(stepped[0], abs=0.2)
+    assert kepler[1] == pytest.approx(stepped[1], abs=50)
+    assert kepler[2] == pytest.approx(stepped[2], rel=1e-5)
+    assert kepler[3:5] == pytest.approx(stepped[3:5], abs=1e-3)
+    assert kepler[5] == stepped[5]
+    assert kepler_count < stepped_count / 2
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from instrumentation import SimulationHooks
+from trajectory import STATE_FIELDS
+
+
+class EventLog(SimulationHooks):
+    def __init__(self):
+        self.events = []
+        self.steps = 0
+
+    def on_step(self, sim, state):
+        self.steps += 1
+
+    def on_stage_ignition(self, sim, state, stage_index):
+        self.events.append(('ignition', stage_index, state.t))
+
+    def on_burnout(self, sim, state, stage_index):
+        self.events.append(('burnout', stage_index, state.t))
+
+    def on_meco(self, sim, state):
+        self.events.append(('meco', state.t))
+
+    def on_circularization(self, sim, state):
+        self.events.append(('circularization', state.t))
+
+
+@pytest.mark.parametrize('circularize', [True, False])
+def test_kernels_match_python_backend(flight, circularize):
+    python = flight(circularize=circularize, backend='python')
+    expected = python.simulate()
+    kernels = flight(circularize=circularize, backend='kernels')
+    trajectory = kernels.simulate()
+
+    assert len(trajectory) == len(expected)
+    for name in STATE_FIELDS:
+        np.testing.assert_array_equal(getattr(trajectory, name), getattr(expected, name))
+    assert trajectory.description == expected.description
+    assert (kernels.loss_gravity, kernels.loss_drag, kernels.deltaV) == \
+        (python.loss_gravity, python.loss_drag, python.deltaV)
+
+
+def test_kernels_call_the_hooks_like_python_backend(flight):
+    logs = {}
+    for backend in ('python', 'kernels'):
+        logs[backend] = EventLog()
+        flight(backend=backend, hooks=[logs[backend]]).simulate()
+
+    assert logs['kernels'].events == logs['python'].events
+    assert logs['kernels'].steps == logs['python'].steps
+
+
+def test_kernels_only_run_euler(flight):
+    with pytest.raises(ValueError):
+        flight(integrator='rk45', backend='kernels')
@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+import pytest
+
+from flight_sim import GravityTurn
+from monte_carlo import MonteCarlo, Normal, P2Quantile, RunningStatistics, Uniform
+
+
+@pytest.mark.parametrize('p', [0.05, 0.5, 0.95])
+def test_p2_quantile_matches_percentile(p):
+    values = np.random.default_rng(1).normal(size=20000)
+    quantile = P2Quantile(p)
+    for x in values.tolist():
+        quantile.add(x)
+    assert quantile.value == pytest.approx(np.percentile(values, p * 100), abs=0.02)
+
+
+def test_p2_quantile_of_few_values():
+    quantile = P2Quantile(0.5)
+    assert math.isnan(quantile.value)
+    for x in (3, 1, 2):
+        quantile.add(x)
+    assert quantile.value == 2
+
+
+def test_chunked_moments_match_numpy():
+    values = np.random.default_rng(2).normal(5, 3, size=1000)
+    statistics = RunningStatistics()
+    for chunk in np.split(values, [1, 10, 300, 301, 777]):
+        statistics.add(chunk)
+
+    assert statistics.count == len(values)
+    assert statistics.mean == pytest.approx(np.mean(values), rel=1e-12)
+    assert statistics.variance == pytest.approx(np.var(values, ddof=1), rel=1e-12)
+    assert (statistics.min, statistics.max) == (values.min(), values.max())
+
+
+def test_non_finite_values_are_counted_as_invalid():
+    statistics = RunningStatistics()
+    statistics.add([1, math.nan, math.inf, 2, -math.inf])
+    statistics.add([math.nan])
+
+    assert (statistics.count, statistics.invalid) == (2, 4)
+    assert (statistics.mean, statistics.variance, statistics.min, statistics.max) == (1.5, 0.5, 1, 2)
+
+
+def test_run_does_not_depend_on_the_workers(stages):
+    dispersions = {'specific_impulse': Normal(1, 0.005), 'dry_mass': Uniform(0.98, 1.02), 'density': Normal(1, 0.05),
+                   'turn_angle': Normal(0, 0.1)}
+    results = [MonteCarlo(stages, GravityTurn(1000, 3500, 3), 300000, False, 0.1, dispersions, seed=3,
+                          workers=workers, chunk_size=3).run(7) for workers in (1, 2)]
+
+    for name, statistics in results[0].statistics.items():
+        other = results[1].statistics[name]
+        assert (statistics.count, statistics.mean, statistics.variance, statistics.percentile(50)) == \
+            (other.count, other.mean, other.variance, other.percentile(50))
+    assert results[0].report() == results[1].report()
+
+
+def test_unknown_dispersions(stages):
+    with pytest.raises(ValueError):
+        MonteCarlo(stages, GravityTurn(1000, 3500, 3), dispersions={'thrust': Normal(1, 0.1)})
@@ -0,0 +1,44 @@
+import math
+
+import pytest
+
+from flight_sim import GravityTurn
+from optimizer import AscentOptimizer, _evaluate, fuel_left_in_orbit
+
+
+def test_fuel_left_uses_the_compiled_vehicle(stages, flight):
+    sim = flight()
+    result = sim.simulate()
+    # changing the stages after the simulation was set up does not change its dry mass
+    stages[-1].payload_mass += 1
+    assert fuel_left_in_orbit(sim, result) == result.m[-1] - sim.vehicle.final_dry_mass
+
+
+def test_evaluation_step_budget(stages):
+    job = (stages, GravityTurn(1000, 3500, 3), 400000, True, 'euler', 0.1)
+    assert math.isfinite(_evaluate(job + (100000, fuel_left_in_orbit)))
+    assert _evaluate(job + (100, fuel_left_in_orbit)) == -math.inf
+
+
+def test_optimize_returns_the_best_candidate(stages):
+    optimizer = AscentOptimizer(stages, population_size=6, seed=1, workers=2)
+    best = optimizer.optimize(generations=2)
+
+    assert best.score == max(optimizer.scores)
+    assert sum(stage.structure_mass + stage.propellant_mass for stage in best.stages) == \
+        pytest.approx(sum(stage.structure_mass + stage.propellant_mass for stage in stages))
+    for name, value in zip(optimizer.names, optimizer.population[optimizer.scores.index(best.score)]):
+        low, high = optimizer.bounds[name]
+        assert low <= value <= high
+
+
+def test_restarted_checkpoint_gives_the_same_result(stages, tmp_path):
+    checkpoint = str(tmp_path / 'optimizer.pickle')
+    AscentOptimizer(stages, population_size=6, seed=1, workers=2, checkpoint=checkpoint).optimize(generations=1)
+    restarted = AscentOptimizer(stages, population_size=6, seed=1, workers=2, checkpoint=checkpoint)
+    assert restarted.generation == 1
+    restarted.optimize(generations=2)
+
+    optimizer = AscentOptimizer(stages, population_size=6, seed=1, workers=2)
+    optimizer.optimize(generations=2)
+    assert (restarted.population, restarted.scores) == (optimizer.population, optimizer.scores)
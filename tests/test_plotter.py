@@ -0,0 +1,36 @@
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip('matplotlib')
+Image = pytest.importorskip('PIL.Image')
+
+from plotter import _FrameWriter  # noqa: E402
+
+
+def test_gif_frames_are_written_as_they_arrive(tmp_path, monkeypatch):
+    # the pillow writer is used without imageio
+    monkeypatch.setitem(sys.modules, 'imageio', None)
+    filename = str(tmp_path / 'frames.gif')
+    frames = []
+    for i in range(4):
+        frame = np.zeros((20, 40, 3), dtype=np.uint8)
+        frame[:, i * 10:(i + 1) * 10] = (255, 0, 0)
+        frames.append(frame)
+
+    with _FrameWriter(filename, fps=5) as writer:
+        sizes = []
+        for frame in frames:
+            writer.write(frame)
+            writer._file.flush()
+            sizes.append((tmp_path / 'frames.gif').stat().st_size)
+    # every frame reached the file before the next one was written
+    assert all(a < b for a, b in zip(sizes, sizes[1:]))
+
+    with Image.open(filename) as image:
+        assert image.n_frames == 4
+        assert image.info['duration'] == 200
+        for i in range(4):
+            image.seek(i)
+            assert tuple(np.asarray(image.convert('RGB'))[10, i * 10 + 5]) == (255, 0, 0)
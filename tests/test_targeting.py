@@ -0,0 +1,76 @@
+import math
+
+import numpy as np
+import pytest
+
+from flight_sim import GravityTurn
+from targeting import METRICS, Targeting
+
+
+class CountingTargeting(Targeting):
+    """Counts the simulated flights and sensitivities, the flights with a turn angle above fail_above fail."""
+
+    fail_above = math.inf
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.flights = 0
+        self.jacobians = 0
+
+    def sensitivities(self, values=None, metrics=None):
+        self.jacobians += 1
+        return super().sensitivities(values, metrics)
+
+    def simulate(self, values):
+        self.flights += 1
+        if values[0] > self.fail_above:
+            return [math.nan] * len(METRICS)
+        return super().simulate(values)
+
+
+@pytest.fixture
+def targeting(stages):
+    return CountingTargeting(stages, GravityTurn(1000, 3500, 3), 400000)
+
+
+def test_sensitivities_are_central_differences(targeting):
+    sensitivities = targeting.sensitivities()
+
+    up, down = (np.array(targeting.simulate([angle, 400000])) for angle in (3.01, 2.99))
+    np.testing.assert_array_equal(sensitivities.metrics, targeting.simulate([3, 400000]))
+    for i, metric in enumerate(METRICS):
+        assert sensitivities.derivative(metric, 'turn_angle') == (up[i] - down[i]) / (2 * 0.01)
+
+
+def test_failed_flights_give_one_sided_differences(targeting):
+    targeting.fail_above = 3.005
+    sensitivities = targeting.sensitivities()
+
+    nominal, down = (np.array(targeting.simulate([angle, 400000])) for angle in (3, 2.99))
+    np.testing.assert_array_equal(sensitivities.jacobian[:, 0], (nominal - down) / 0.01)
+    assert np.isfinite(sensitivities.jacobian).all()
+
+
+def test_solve_reaches_a_reachable_target(targeting):
+    apoapsis, periapsis, _ = targeting.simulate([3.2, 410000])
+    result = targeting.solve({'apoapsis_height': apoapsis, 'periapsis_height': periapsis})
+
+    assert result.converged
+    assert result.metrics['apoapsis_height'] == pytest.approx(apoapsis, abs=500)
+    assert result.metrics['periapsis_height'] == pytest.approx(periapsis, abs=500)
+    # the nominal flights of the line search are counted on top of the sensitivities of every iteration
+    assert result.flights == targeting.flights - 1 >= 5 * (result.iterations + 1)
+
+
+def test_line_search_only_simulates_the_nominal_flight(targeting):
+    apoapsis, periapsis, _ = targeting.simulate([3.2, 410000])
+    # the steps towards the target fail and are halved
+    targeting.fail_above = 3.1
+    targeting.flights = 0
+    result = targeting.solve({'apoapsis_height': apoapsis, 'periapsis_height': periapsis}, max_iterations=3)
+
+    assert not result.converged and result.values['turn_angle'] <= 3.1
+    # the halvings only simulate the nominal flight
+    assert targeting.jacobians == result.iterations + 1
+    assert result.flights == targeting.flights > 5 * targeting.jacobians
+    assert np.isfinite(result.sensitivities.jacobian).all()
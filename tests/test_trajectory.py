@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from trajectory import Trajectory, STATE_FIELDS
+
+# final state (t, v, m, h, gamma, local_horizon) and losses (gravity, drag, deltaV) of the original
+# simulation with deep copied states, GravityTurn(1000, 3500, 3), 400 km target orbit and 0.05 s steps
+REFERENCE = {
+    True: (17647, (882.3499999997453, 7660.574168953501, 519.8924359323764, 400376.41275094287, 3.1426668481225466,
+                   -0.740277187755937), (1604.5270639107132, 93.63204789643272, 9358.733280760576)),
+    False: (5546, (277.3000000000288, 7809.320091838332, 547.3551224995391, 144777.07480351502, 3.025216156639446,
+                   -0.10391740194213833), (1283.243017248587, 93.62945031336677, 9186.19255940029)),
+}
+
+
+@pytest.mark.parametrize('circularize', [True, False])
+def test_euler_matches_reference(flight, circularize):
+    sim = flight(circularize=circularize, time_step=0.05)
+    trajectory = sim.simulate()
+
+    count, final, losses = REFERENCE[circularize]
+    state = trajectory[-1]
+    assert len(trajectory) == count
+    assert (state.t, state.v, state.m, state.h, state.gamma, state.local_horizon) == final
+    assert (sim.loss_gravity, sim.loss_drag, sim.deltaV) == losses
+
+
+def test_trajectory_stores_the_yielded_states(flight):
+    sim = flight(time_step=0.05)
+    trajectory = sim.simulate()
+    states = [(state.t, state.h, state.v, state.m, state.description)
+              for state in flight(time_step=0.05).simulate_iter()]
+
+    assert [(state.t, state.h, state.v, state.m, state.description) for state in trajectory] == states
+    assert trajectory[-1].orbit.apoapsis_height == trajectory.apoapsis_height[-1]
+
+
+def test_from_columns_round_trip(flight):
+    trajectory = flight(circularize=False, time_step=0.05).simulate()
+    columns = {name: getattr(trajectory, name) for name in STATE_FIELDS}
+    copy = Trajectory.from_columns(columns, trajectory.description_codes)
+
+    for name in STATE_FIELDS:
+        np.testing.assert_array_equal(getattr(copy, name), getattr(trajectory, name))
+    assert copy.description == trajectory.description
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+
+from lod import decimate
+from trajectory import STATE_FIELDS
+from trajectory_file import TrajectoryFile, TrajectoryFileSink, load_trajectory, save_trajectory
+
+
+def assert_same_states(actual, expected):
+    assert len(actual) == len(expected)
+    for name in STATE_FIELDS:
+        np.testing.assert_array_equal(getattr(actual, name), getattr(expected, name))
+    assert actual.description == expected.description
+
+
+def test_sink_appends_records_while_running(flight, tmp_path):
+    filename = str(tmp_path / 'flight.traj')
+    sink = TrajectoryFileSink(filename, flight(), chunk_size=100)
+    sizes = []
+    for state in flight().simulate_iter():
+        sink.write(state)
+        sizes.append(os.path.getsize(filename))
+    sink.close()
+
+    # the file grows by a chunk of records at a time instead of at the end
+    assert len(set(sizes)) > 10
+    expected = flight().simulate()
+    assert_same_states(load_trajectory(filename), expected)
+    assert TrajectoryFile(filename).metadata['target_orbit'] == 400000
+
+
+def test_time_range(flight, tmp_path):
+    filename = str(tmp_path / 'flight.traj')
+    expected = flight().simulate()
+    save_trajectory(filename, expected)
+
+    part = load_trajectory(filename, 100, 200)
+    assert part.t[0] >= 100 > part.t[0] - 0.1 - 1e-9
+    assert part.t[-1] <= 200
+    np.testing.assert_array_equal(part.h, expected.h[(expected.t >= 100) & (expected.t <= 200)])
+
+
+def test_sink_with_level_of_detail(flight, tmp_path):
+    filename = str(tmp_path / 'flight.traj')
+    sim = flight()
+    sim.simulate_to(TrajectoryFileSink(filename, sim, buckets=256))
+
+    expected = flight().simulate()
+    metadata = TrajectoryFile(filename).metadata
+    assert (metadata['buckets'], metadata['steps']) == (256, len(expected))
+    assert_same_states(load_trajectory(filename), decimate(expected, 256))
+    assert os.listdir(tmp_path) == ['flight.traj']
+
+
+def test_empty_file(tmp_path):
+    filename = str(tmp_path / 'empty.traj')
+    TrajectoryFileSink(filename).close()
+    assert len(load_trajectory(filename)) == 0
@@ -0,0 +1,116 @@
+import numpy as np
+
+from orbit import Orbit, orbit_elements
+
+# state fields stored as one column each
+STATE_FIELDS = ('t', 'v', 'm', 'h', 'gamma', 'a', 'temp', 'local_horizon')
+# orbit elements, computed from the state columns when they are read
+ORBIT_FIELDS = ('semi_major_axis', 'eccentricity', 'periapsis_height', 'apoapsis_height')
+FIELDS = STATE_FIELDS + ORBIT_FIELDS
+
+# state descriptions are packed as small integer codes
+DESCRIPTIONS = ('', 'Ascent', 'Waiting for apoapsis', 'Circularizing')
+DESCRIPTION_CODES = {description: code for code, description in enumerate(DESCRIPTIONS)}
+
+
+class Trajectory:
+    """Stores the flight states column by column in growable numpy arrays.
+
+    Indexing and iterating yields State objects, so it can be used like the list of states
+    the simulation used to return. Whole columns are available as attributes, e.g. trajectory.h.
+    The orbit elements are computed for all states at once when one of them is read.
+    """
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._capacity = max(1, capacity)
+        self._columns = {name: np.empty(self._capacity) for name in STATE_FIELDS}
+        self._description = np.empty(self._capacity, dtype=np.int8)
+        self._elements = None
+
+    @classmethod
+    def from_columns(cls, columns, description_codes, copy=True):
+        """Builds a trajectory from arrays holding one value per state for every state field.
+
+        Without copy the arrays are used as they are, e.g. memory-mapped columns of a file. They are
+        only copied once the trajectory grows.
+        """
+        size = len(description_codes)
+        if not copy:
+            trajectory = cls(0)
+            trajectory._size = trajectory._capacity = size
+            trajectory._columns = {name: columns[name] for name in STATE_FIELDS}
+            trajectory._description = description_codes
+            return trajectory
+
+        trajectory = cls(size)
+        trajectory._size = size
+        for name in STATE_FIELDS:
+            trajectory._columns[name][:size] = columns[name]
+        trajectory._description[:size] = description_codes
+        return trajectory
+
+    def __len__(self):
+        return self._size
+
+    def __getattr__(self, name):
+        # only called for attributes not found the usual way
+        if name in STATE_FIELDS:
+            return self._columns[name][:self._size]
+        if name in ORBIT_FIELDS:
+            if self._elements is None:
+                self._elements = orbit_elements(self.h, self.v, self.gamma)
+            return self._elements[name]
+        raise AttributeError(name)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._state_at(i) for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('trajectory index out of range')
+        return self._state_at(index)
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._state_at(i)
+
+    @property
+    def description(self):
+        """Description strings of all states."""
+        return [DESCRIPTIONS[code] for code in self._description[:self._size]]
+
+    @property
+    def description_codes(self):
+        return self._description[:self._size]
+
+    def append(self, state):
+        """Stores a copy of the values of the given state."""
+        if self._size == self._capacity:
+            self._grow()
+
+        i = self._size
+        columns = self._columns
+        for name in STATE_FIELDS:
+            columns[name][i] = getattr(state, name)
+        self._description[i] = DESCRIPTION_CODES[state.description]
+        self._size += 1
+        self._elements = None
+
+    def _grow(self):
+        self._capacity = max(1, self._capacity * 2)
+        for name, column in self._columns.items():
+            self._columns[name] = np.resize(column, self._capacity)
+        self._description = np.resize(self._description, self._capacity)
+
+    def _state_at(self, i):
+        # imported here as flight_sim imports this module
+        from flight_sim import State
+
+        state = State()
+        for name in STATE_FIELDS:
+            setattr(state, name, float(self._columns[name][i]))
+        state.orbit = Orbit(state.h, state.v, state.gamma)
+        state.description = DESCRIPTIONS[self._description[i]]
+        return state
@@ -0,0 +1,160 @@
+"""Trajectory files: the run metadata followed by the flight states as fixed size records.
+
+Layout of a file:
+    8 bytes     magic, b'RFSTRAJ2'
+    8 bytes     little endian number of records, written when the file is closed
+    4 bytes     little endian length of the header
+    header      json with the columns and the run metadata, padded to 64 bytes
+    records     one record per state, the little endian float64 values of the state fields followed by
+                the description code, like the records of sinks.BinarySink
+
+The header is written first and the records are appended as the simulation runs. As the records
+have a fixed width the file is memory-mapped, and a time range is found by binary search on the
+time column, so only the pages of the requested range are read.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from sinks import BinarySink
+from trajectory import Trajectory, STATE_FIELDS, DESCRIPTIONS
+
+MAGIC = b'RFSTRAJ2'
+ALIGNMENT = 64
+# float64 values of a record, the state fields and the description code
+RECORD_SIZE = len(STATE_FIELDS) + 1
+# records copied at once when a trajectory is written or decimated
+CHUNK_SIZE = 4096
+
+
+def run_metadata(sim):
+    """Describes the flight of a FlightSim by its stages, gravity turn, time step and target orbit."""
+    return {
+        'stages': [{name: getattr(stage, name) for name in ('structure_mass', 'propellant_mass', 'specific_impulse',
+                                                             'propellant_mass_flux', 'payload_mass')}
+                   for stage in sim.stages],
+        'gravity_turn': {'start': sim.gravity_turn.start, 'end': sim.gravity_turn.end,
+                         'angle': sim.gravity_turn.angle},
+        'time_step': sim.time_step,
+        'target_orbit': sim.target_orbit,
+        'circularize': sim.circ,
+        'integrator': sim.integrator,
+        'kepler_coast': sim.kepler_coast,
+    }
+
+
+def save_trajectory(filename, trajectory, sim=None, metadata=None):
+    """Writes the trajectory with the metadata of the simulation that produced it, if one is given."""
+    if sim is not None:
+        metadata = {**run_metadata(sim), **(metadata or {})}
+    columns = [getattr(trajectory, name) for name in STATE_FIELDS] + [trajectory.description_codes]
+    with open(filename, 'wb') as f:
+        _write_header(f, metadata, len(trajectory))
+        for start in range(0, len(trajectory), CHUNK_SIZE):
+            f.write(np.stack([column[start:start + CHUNK_SIZE] for column in columns], axis=1)
+                    .astype('<f8').tobytes())
+
+
+def _write_header(f, metadata, count=0):
+    header = json.dumps({'columns': STATE_FIELDS, 'descriptions': DESCRIPTIONS, 'metadata': metadata or {}}).encode()
+    # pad the header so that the records are aligned
+    header += b' ' * (-(len(MAGIC) + 12 + len(header)) % ALIGNMENT)
+    f.write(MAGIC)
+    f.write(struct.pack('<QI', count, len(header)))
+    f.write(header)
+
+
+class TrajectoryFile:
+    """Memory-mapped trajectory file.
+
+    Nothing but the header is read when opening the file. The columns are views of a numpy memmap
+    of the records, which loads its pages when accessed.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{filename} is not a trajectory file')
+            self.count, header_size = struct.unpack('<QI', f.read(12))
+            header = json.loads(f.read(header_size))
+
+        self.metadata = header['metadata']
+        if tuple(header['columns']) != STATE_FIELDS or tuple(header['descriptions']) != DESCRIPTIONS:
+            raise ValueError(f'{filename} was written with other state fields')
+
+        if self.count:
+            self.records = np.memmap(filename, dtype='<f8', mode='r', offset=len(MAGIC) + 12 + header_size,
+                                     shape=(self.count, RECORD_SIZE))
+        else:
+            # an empty memmap can not be created
+            self.records = np.empty((0, RECORD_SIZE), dtype='<f8')
+
+    def __len__(self):
+        return self.count
+
+    def column(self, name):
+        return self.records[:, STATE_FIELDS.index(name)]
+
+    def index_range(self, start_time=None, end_time=None):
+        """Indices of the first state at or after start_time and the first after end_time."""
+        t = self.column('t')
+        start = 0 if start_time is None else int(np.searchsorted(t, start_time, side='left'))
+        end = self.count if end_time is None else int(np.searchsorted(t, end_time, side='right'))
+        return start, end
+
+    def trajectory(self, start_time=None, end_time=None):
+        """The states between start_time and end_time as a Trajectory viewing the mapped columns."""
+        start, end = self.index_range(start_time, end_time)
+        columns = {name: self.records[start:end, i] for i, name in enumerate(STATE_FIELDS)}
+        return Trajectory.from_columns(columns, self.records[start:end, -1].astype(np.int8), copy=False)
+
+
+def load_trajectory(filename, start_time=None, end_time=None):
+    return TrajectoryFile(filename).trajectory(start_time, end_time)
+
+
+class TrajectoryFileSink(BinarySink):
+    """Writes the states to a trajectory file as they arrive, in chunks of chunk_size records.
+
+    The header with the run metadata is written first and the number of records when the sink is
+    closed. With buckets the records go to a temporary file, which is reduced to the states of that
+    level of detail when closed, see the lod module.
+    """
+
+    def __init__(self, filename, sim=None, metadata=None, buckets=None, chunk_size=CHUNK_SIZE):
+        if sim is not None:
+            metadata = {**run_metadata(sim), **(metadata or {})}
+        self.filename = filename
+        self.metadata = metadata or {}
+        self.buckets = buckets
+        self.count = 0
+        super().__init__(filename + '.tmp' if buckets else filename, chunk_size)
+        _write_header(self.file, self.metadata)
+
+    def flush(self):
+        self.count += self._size
+        super().flush()
+
+    def close(self):
+        self.flush()
+        self.file.seek(len(MAGIC))
+        self.file.write(struct.pack('<Q', self.count))
+        self.file.close()
+        if self.buckets:
+            self._decimate(self.file.name)
+            os.remove(self.file.name)
+
+    def _decimate(self, source):
+        """Writes the states of the source file kept at the level of detail to the trajectory file."""
+        from lod import trajectory_levels
+
+        source = TrajectoryFile(source)
+        indices = trajectory_levels(source.trajectory(), self.buckets, 1).indices(self.buckets)
+        metadata = {**self.metadata, 'buckets': self.buckets, 'steps': len(source)}
+        with open(self.filename, 'wb') as f:
+            _write_header(f, metadata, len(indices))
+            for start in range(0, len(indices), CHUNK_SIZE):
+                f.write(source.records[indices[start:start + CHUNK_SIZE]].tobytes())
@@ -0,0 +1,51 @@
+from collections import namedtuple
+
+import numpy as np
+
+# values of one stage in SI units, as plain floats for the step by step simulation
+StageSchedule = namedtuple('StageSchedule', ('thrust', 'mass_flux', 'start_mass', 'upper_mass', 'burn_time'))
+
+
+class Vehicle:
+    """Immutable description of a staged rocket in SI units, compiled once from its stages.
+
+    The stages keep their masses in tons, the vehicle holds read-only numpy arrays with one value per
+    stage, masses in kg:
+        start_mass      mass of the full stage including its payload
+        upper_mass      mass of all stages above it, carried as payload
+        ignition_mass   mass of the rocket when the stage ignites
+    """
+
+    def __init__(self, stages):
+        assign = super().__setattr__
+        assign('stage_count', len(stages))
+        assign('thrust', _array(stage.thrust for stage in stages))
+        assign('mass_flux', _array(stage.propellant_mass_flux for stage in stages))
+        assign('burn_time', _array(stage.burn_time for stage in stages))
+        assign('structure_mass', _array(stage.structure_mass * 1000 for stage in stages))
+        assign('propellant_mass', _array(stage.propellant_mass * 1000 for stage in stages))
+        assign('payload_mass', _array(stage.payload_mass * 1000 for stage in stages))
+
+        # summed like the stages always were, so the masses match to the last bit
+        assign('start_mass', _array(stage.mass_at_time(0) for stage in stages))
+        assign('upper_mass', _array(sum(s.mass_at_time(0) for s in stages[i + 1:]) for i in range(len(stages))))
+        assign('ignition_mass', _lock(self.upper_mass + self.start_mass))
+        assign('final_dry_mass', (stages[-1].payload_mass + stages[-1].structure_mass) * 1000 if stages else 0)
+
+        assign('schedules', tuple(StageSchedule(*map(float, values)) for values in zip(
+            self.thrust, self.mass_flux, self.start_mass, self.upper_mass, self.burn_time)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('a vehicle is immutable, compile a new one from the changed stages')
+
+    def __len__(self):
+        return self.stage_count
+
+
+def _array(values):
+    return _lock(np.fromiter(values, dtype=float))
+
+
+def _lock(array):
+    array.flags.writeable = False
+    return array